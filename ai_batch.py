@@ -0,0 +1,96 @@
+# ai_batch.py
+"""
+Rollout casuali in batch con NumPy.
+
+Migliaia di completamenti casuali vengono giocati insieme: le mani sono matrici booleane
+(batch, giocatori, 60), le mosse legali una maschera per riga e la carta vincente della mano
+si aggiorna con operazioni su array sulla tabella engine.trick.BEATS,
+equivalente a engine.trick.winning_card.
+
+NumPy è opzionale: senza, AVAILABLE è False e si usa il backend Python di ai_sim.
+"""
+from engine.card import NUM_CARDS, NO_SUIT, FIRST_WIZARD, FIRST_JESTER
+from engine.trick import BEATS
+from ai_sim import SUIT_MASKS, SPECIAL_MASK, LEAD_PENDING
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AVAILABLE = np is not None
+
+if AVAILABLE:
+    _CARD_IDS = np.arange(NUM_CARDS)
+    # BEATS[trump, lead, best, card]
+    _BEATS = np.frombuffer(BEATS, dtype=np.uint8).reshape(NO_SUIT + 1, NO_SUIT + 1, NUM_CARDS, NUM_CARDS).astype(bool)
+    # FOLLOW[lead] = carte del seme di uscita; righe 4 e 5 (nessun seme / ancora da decidere) vuote
+    _FOLLOW = np.zeros((NO_SUIT + 2, NUM_CARDS), dtype=bool)
+    for _s in range(NO_SUIT):
+        _FOLLOW[_s] = (SUIT_MASKS[_s] >> _CARD_IDS) & 1 == 1
+    _SPECIAL = np.array([(SPECIAL_MASK >> c) & 1 == 1 for c in range(NUM_CARDS)])
+    # Carte ammesse quando si deve rispondere al seme: seme di uscita + Wizard e Jester
+    _ALLOWED = _FOLLOW | _SPECIAL
+    # Seme di uscita stabilito da una carta giocata quando il seme è ancora da decidere
+    _LEAD_OF = np.where(_CARD_IDS < FIRST_WIZARD, _CARD_IDS // 13,
+                        np.where(_CARD_IDS < FIRST_JESTER, NO_SUIT, LEAD_PENDING))
+
+
+def _hands_matrix(states):
+    """Converte le bitmask delle mani in un array booleano (batch, giocatori, 60)"""
+    raw = np.array([s.hands for s in states], dtype=np.uint64)
+    return ((raw[:, :, None] >> _CARD_IDS.astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+def batch_rollouts(states, rng):
+    """
+    Gioca a caso (mosse valide) fino alla fine tutti gli SimState passati.
+    Gli stati devono avere lo stesso numero di giocatori e di carte ancora da giocare.
+    rng: numpy.random.Generator
+    Ritorna un array (batch, giocatori) con le prese finali.
+    """
+    batch = len(states)
+    num_players = states[0].num_players
+    rows = np.arange(batch)
+
+    hands = _hands_matrix(states)
+    trump = np.array([s.trump for s in states])
+    turn = np.array([s.turn for s in states])
+    lead = np.array([s.lead for s in states])
+    trick_len = np.array([s.trick_len for s in states])
+    best_seat = np.array([s.best_seat for s in states])
+    best_card = np.array([s.best_card for s in states])
+    tricks = np.array([s.tricks for s in states])
+
+    plays_left = int(hands[0].sum())
+
+    for _ in range(plays_left):
+        hand = hands[rows, turn]
+
+        # Mosse legali: se ho il seme di uscita devo rispondere (Wizard e Jester sempre ammessi)
+        lead_row = np.where(lead >= 0, lead, NO_SUIT + 1)
+        must_follow = (hand & _FOLLOW[lead_row]).any(axis=1)
+        legal = hand & (_ALLOWED[lead_row] | ~must_follow[:, None])
+
+        # Scelta uniforme fra le mosse legali: la k-esima carta legale con k casuale
+        counts = legal.cumsum(axis=1, dtype=np.uint8)
+        k = (rng.random(batch) * counts[:, -1]).astype(np.uint8)
+        card = (counts <= k[:, None]).argmin(axis=1)
+
+        hands[rows, turn, card] = False
+
+        lead = np.where(lead == LEAD_PENDING, _LEAD_OF[card], lead)
+        better = (best_card < 0) | _BEATS[trump, np.where(lead >= 0, lead, NO_SUIT), best_card, card]
+        best_card = np.where(better, card, best_card)
+        best_seat = np.where(better, turn, best_seat)
+
+        trick_len += 1
+        closed = trick_len == num_players
+        if closed.any():
+            np.add.at(tricks, (rows[closed], best_seat[closed]), 1)
+        turn = np.where(closed, best_seat, (turn + 1) % num_players)
+        lead = np.where(closed, LEAD_PENDING, lead)
+        trick_len = np.where(closed, 0, trick_len)
+        best_card = np.where(closed, -1, best_card)
+
+    return tricks
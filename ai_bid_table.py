@@ -0,0 +1,65 @@
+# ai_bid_table.py
+"""
+Tabella delle scommesse precalcolata.
+
+Per ogni situazione di scommessa (giocatori, carte a testa, posto rispetto al mazziere,
+briscola sì/no e classe della mano) contiene le prese attese, stimate offline con
+`python -m tools.build_bid_table`. Il file viene caricato una volta sola e la scommessa
+del bot diventa una lettura in un dizionario; le situazioni assenti dalla tabella
+tornano alla stima con i rollout.
+"""
+import json
+import os
+from engine.card import FIRST_WIZARD, FIRST_JESTER, NO_SUIT
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bid_table.json')
+
+# Valore minimo per considerare "alta" una carta (numeri 1..13)
+HIGH_TRUMP = 11
+HIGH_SIDE = 12
+
+_table = None
+
+
+def hand_class(cards, trump: int) -> tuple:
+    """
+    Classe di una mano: (wizard, jester, briscole, briscole alte, carte alte negli altri semi).
+    cards: carte come interi; trump: seme di briscola come intero (4 = nessuna)
+    """
+    wizards = jesters = trumps = high_trumps = high_side = 0
+    for c in cards:
+        if c >= FIRST_JESTER:
+            jesters += 1
+        elif c >= FIRST_WIZARD:
+            wizards += 1
+        elif c // 13 == trump:
+            trumps += 1
+            if c % 13 + 1 >= HIGH_TRUMP:
+                high_trumps += 1
+        elif c % 13 + 1 >= HIGH_SIDE:
+            high_side += 1
+    return wizards, jesters, trumps, high_trumps, high_side
+
+
+def table_key(cards, trump: int, num_players: int, seat: int) -> str:
+    """Chiave della tabella; seat è il posto relativo al mazziere"""
+    cls = hand_class(cards, trump)
+    return ','.join(map(str, (num_players, len(cards), seat, int(trump < NO_SUIT)) + cls))
+
+
+def load_bid_table(path=TABLE_PATH) -> dict:
+    """Carica la tabella (una sola volta). Se il file manca la tabella è vuota."""
+    global _table
+    if _table is None:
+        try:
+            with open(path) as f:
+                _table = json.load(f)['table']
+        except (OSError, ValueError, KeyError):
+            print(f"[AI WARNING] Tabella delle scommesse non disponibile: {path}")
+            _table = {}
+    return _table
+
+
+def lookup(cards, trump: int, num_players: int, seat: int):
+    """Prese attese per la situazione, o None se non è in tabella"""
+    return load_bid_table().get(table_key(cards, trump, num_players, seat))
@@ -0,0 +1,67 @@
+# ai_endgame.py
+"""
+Risolutore esatto per il finale di un mondo determinizzato (tutte le mani note).
+
+Con 1-3 carte a testa l'albero rimasto è piccolo: invece dei rollout casuali si calcola
+il risultato esatto con un minimax a più giocatori (max^n): ogni giocatore sceglie la carta
+che massimizza il proprio reward rispetto alla sua scommessa.
+Le posizioni già risolte sono salvate in una tabella di trasposizione indicizzata
+da mani rimaste, stato della mano in corso e prese fatte.
+"""
+from ai_sim import bits, bid_reward, WIZARD_MASK, JESTER_MASK
+
+# Reward massimo possibile (scommessa centrata): trovato quello è inutile cercare altre carte
+MAX_REWARD = bid_reward(0, 0)
+
+
+class EndgameSolver:
+    def __init__(self, bids):
+        """
+        bids: scommessa di ogni posto (indici come in Round.players)
+        """
+        self.bids = bids
+        self.table = {}
+
+    def _key(self, state):
+        # A inizio mano best_seat/best_card non contano: li normalizziamo per avere più trasposizioni
+        if state.trick_len:
+            trick = (state.lead, state.trick_len, state.best_seat, state.best_card)
+        else:
+            trick = None
+        return tuple(state.hands), state.turn, trick, tuple(state.tricks)
+
+    @staticmethod
+    def _distinct_moves(moves):
+        """Due Jester (o due Wizard) nella stessa mano sono equivalenti: ne basta uno"""
+        for special in (WIZARD_MASK, JESTER_MASK):
+            same = moves & special
+            if same & (same - 1):
+                moves &= ~(same & (same - 1))
+        return bits(moves)
+
+    def solve(self, state):
+        """Ritorna la tupla delle prese finali per posto con gioco perfetto da entrambe le parti"""
+        if not state.tricks_left:
+            return tuple(state.tricks)
+
+        key = self._key(state)
+        outcome = self.table.get(key)
+        if outcome is not None:
+            return outcome
+
+        seat = state.turn
+        bid = self.bids[seat]
+        best_reward = None
+        for card in self._distinct_moves(state.valid_moves()):
+            child = state.copy()
+            child.play(card)
+            result = self.solve(child)
+            reward = bid_reward(result[seat], bid)
+            if best_reward is None or reward > best_reward:
+                best_reward = reward
+                outcome = result
+                if reward == MAX_REWARD:
+                    break
+
+        self.table[key] = outcome
+        return outcome
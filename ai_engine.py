@@ -1,319 +1,585 @@
 # ai_engine.py
+import math
+import multiprocessing
+import pickle
 import random
-import copy
-from engine.card import Card, Suit, CardType
-from engine.enums import RoundState
-from engine.deck import create_deck
-from engine.trick import winning_card
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from engine.card import FIRST_WIZARD, FIRST_JESTER, NO_SUIT
+from engine.trick import winning_index
+import ai_batch
+import ai_bid_table
+import ai_stats
+from ai_endgame import EndgameSolver
+from ai_sim import SimState, DealSampler, NUM_CARDS, card_to_int, suit_to_int, mask_of, mask_of_ints
+
+
+# Cache delle stime di scommessa: firma canonica della mano -> prese attese
+_BID_CACHE = OrderedDict()
+_BID_CACHE_SIZE = 20000
+
+# Con più worker: tempo tenuto da parte per raccogliere e sommare i risultati prima della deadline
+_PARALLEL_COLLECT_MARGIN = 0.010
+
+
+def _bid_cache_get(key):
+    value = _BID_CACHE.get(key)
+    if value is not None:
+        _BID_CACHE.move_to_end(key)
+    return value
+
+
+def _bid_cache_put(key, value):
+    _BID_CACHE[key] = value
+    if len(_BID_CACHE) > _BID_CACHE_SIZE:
+        _BID_CACHE.popitem(last=False)
+
+
+def hand_signature(cards, trump, num_players, seat):
+    """
+    Firma canonica di una situazione di scommessa.
+    cards: carte in mano come interi; trump: seme di briscola come intero (4 = nessuna)
+    seat: posto relativo al mazziere
+    I semi non di briscola sono intercambiabili, quindi vengono ordinati; Wizard e Jester contano solo in numero.
+    """
+    wizards = jesters = 0
+    suits = [[], [], [], []]
+    for c in cards:
+        if c >= FIRST_JESTER:
+            jesters += 1
+        elif c >= FIRST_WIZARD:
+            wizards += 1
+        else:
+            suits[c // 13].append(c % 13)
+    suits = [tuple(sorted(values, reverse=True)) for values in suits]
+
+    if trump < NO_SUIT:
+        trump_values = suits.pop(trump)
+    else:
+        trump_values = None
+    return wizards, jesters, trump_values, tuple(sorted(suits)), num_players, seat
 
 
 class MonteCarloBot:
-    def __init__(self, bot_name, real_round):
+    # Mondi campionati quando il finale viene risolto in modo esatto
+    ENDGAME_WORLDS = 30
+
+    def __init__(self, bot_name, real_round, rng=None, rollout_backend='python', endgame_cards=2):
         """
         bot_name: Il nome del giocatore controllato dall'AI
         real_round: L'istanza reale dell'oggetto Round corrente
+        rng: generatore casuale (random.Random); di default uno nuovo, non il modulo random
+        rollout_backend: 'python' (un rollout alla volta su SimState) o 'numpy' (batch vettorizzati)
+        endgame_cards: con al massimo queste carte in mano ogni mondo viene risolto in modo esatto
+        invece che con i rollout casuali (0 = mai)
         """
         self.bot_name = bot_name
         self.real_round = real_round
+        self.rng = rng if rng is not None else random.Random()
+        if rollout_backend == 'numpy' and not ai_batch.AVAILABLE:
+            print("[AI WARNING] NumPy non disponibile, uso i rollout Python")
+            rollout_backend = 'python'
+        self.rollout_backend = rollout_backend
+        self.endgame_cards = endgame_cards
+        self._np_rng = None
+        self._endgame_solver = None
         self.my_player = next(p for p in real_round.players if p.name == bot_name)
+        self.my_seat = real_round.players.index(self.my_player)
+        self._base_state = None
+        self._deal_sampler = None
+        # Contatori per ai_stats: rollout (o soluzioni esatte) eseguiti, margine e origine della scelta
+        self.rollouts = 0
+        self.margin = None
+        self.source = None
+
+    def _prepare_simulation(self):
+        """Calcola una sola volta lo stato base e il pool di carte ignote per le determinizzazioni"""
+        if self._base_state is not None:
+            return
+
+        # Carte NOTE: mie + tavolo attuale + storia passata + briscola scoperta
+        known = set()
+        for c in self.my_player.hand: known.add(card_to_int(c))
+        for c in self.real_round.current_trick: known.add(card_to_int(c))
+        for c in self.real_round.played_cards_history: known.add(card_to_int(c))
+        if self.real_round.trump_card_object:
+            known.add(card_to_int(self.real_round.trump_card_object))
+
+        unknown_cards = [c for c in range(NUM_CARDS) if c not in known]
+        self._base_state = SimState.from_round(self.real_round, self.my_seat)
+
+        # Avversari da riempire e semi che sappiamo mancare a ciascuno
+        needs = {}
+        voids = {}
+        for seat, p in enumerate(self.real_round.players):
+            if p.name != self.bot_name:
+                needs[seat] = len(p.hand)
+                voids[seat] = {suit_to_int(s) for s in self.real_round.missing_suits.get(p.name, ())}
+        self._deal_sampler = DealSampler(unknown_cards, needs, voids)
 
     def _determinize_round(self):
         """
-        Crea un mondo possibile coerente con le informazioni note
+        Crea un mondo possibile coerente con le informazioni note.
+        Ritorna uno SimState (mani come bitmask) e non una copia del Round.
+        Le carte ignote (tutto meno mie, tavolo, storia, briscola) vengono distribuite
+        dal DealSampler, che rispetta sempre i semi mancanti degli avversari.
         """
-        # 1. Identifica carte NOTE (Mie + Tavolo attuale + Storia passata)
-        known_cards_ids = set()
-        for c in self.my_player.hand: known_cards_ids.add(str(c))
-        for c in self.real_round.current_trick: known_cards_ids.add(str(c))
-
-        # Recupera la memoria storica dal round (se implementata come suggerito)
-        if hasattr(self.real_round, 'played_cards_history'):
-            # Se played_cards_history contiene oggetti Card
-            for item in self.real_round.played_cards_history:
-                # Gestisce sia se è una lista di Card, sia se è una lista di tuple (Card, Player)
-                card_obj = item[0] if isinstance(item, (list, tuple)) else item
-                known_cards_ids.add(str(card_obj))
-
-        # 2. Genera il pool di carte IGNOTE
-        full_deck = create_deck()
-        base_unknown_cards = [c for c in full_deck if str(c) not in known_cards_ids]
-
-        # Lista degli avversari da riempire
-        opponents = [p for p in self.real_round.players if p.name != self.bot_name]
-
-        # --- STRATEGIA: MOST CONSTRAINED FIRST ---
-        # Ordiniamo gli avversari: chi ha PIÙ semi vietati viene servito per PRIMO.
-        # Chi ha meno vincoli è più flessibile e può prendere quello che avanza.
-        opponents_sorted = sorted(
-            opponents,
-            key=lambda p: len(self.real_round.missing_suits.get(p.name, set())),
-            reverse=True
-        )
-
-        # Tentiamo di distribuire fino a 10 volte
-        max_retries = 10
-
-        for attempt in range(max_retries):
-            # Clona il round per questo tentativo
-            sim_round = copy.deepcopy(self.real_round)
-
-            # Mescola le carte ignote per questo tentativo
-            current_unknown = list(base_unknown_cards)
-            random.shuffle(current_unknown)
-
-            distribution_success = True
-
-            for real_p in opponents_sorted:
-                p_name = real_p.name
-
-                # Trova il giocatore corrispondente nell'oggetto sim_round
-                sim_p = next(sp for sp in sim_round.players if sp.name == p_name)
-
-                # Quante carte servono
-                cards_needed = len(real_p.hand)
-                sim_p.hand = []  # Svuota mano simulata
-
-                forbidden_suits = self.real_round.missing_suits.get(p_name, set())
-
-                for _ in range(cards_needed):
-                    if not current_unknown:
-                        distribution_success = False
-                        break
-
-                    found_card = None
-                    found_index = -1
-
-                    # Cerca la prima carta valida nel mazzo mescolato
-                    for i, card in enumerate(current_unknown):
-                        is_valid = True
-
-                        if card.type == CardType.NUMBER:
-                            if card.suit in forbidden_suits:
-                                is_valid = False
-
-                        if is_valid:
-                            found_card = card
-                            found_index = i
-                            break
-
-                    if found_card:
-                        sim_p.hand.append(found_card)
-                        current_unknown.pop(found_index)
-                    else:
-                        # Vicolo cieco: questo giocatore non può prendere nessuna delle carte rimaste
-                        distribution_success = False
-                        break
-
-                if not distribution_success:
-                    break
-
-            if distribution_success:
-                # ABBIAMO TROVATO UNA CONFIGURAZIONE VALIDA!
-                return sim_round
-
-        # --- FALLBACK ---
-        print(f"[AI WARNING] Fallback distribution triggered for {self.bot_name}")
-
-        fallback_round = copy.deepcopy(self.real_round)
-        random.shuffle(base_unknown_cards)
-        for p in fallback_round.players:
-            if p.name == self.bot_name: continue
-            real_p = next(op for op in self.real_round.players if op.name == p.name)
-            p.hand = base_unknown_cards[:len(real_p.hand)]
-            base_unknown_cards = base_unknown_cards[len(real_p.hand):]
-
-        return fallback_round
-
-    def _play_randomout(self, sim_round):
+        self._prepare_simulation()
+        sim_state = self._base_state.copy()
+        for seat, hand_mask in self._deal_sampler.sample(self.rng).items():
+            sim_state.hands[seat] = hand_mask
+        return sim_state
+
+    @property
+    def deal_stats(self):
+        """Contatori del campionatore: mondi generati, quanti con vincoli stretti, scelte escluse"""
+        self._prepare_simulation()
+        return self._deal_sampler.stats
+
+    def profile(self):
+        """Contatori dell'ultima decisione, per ai_stats"""
+        stats = self._deal_sampler.stats if self._deal_sampler is not None else {}
+        return {
+            "rollouts": self.rollouts,
+            "worlds": stats.get("samples", 0),
+            "tight_worlds": stats.get("tight_samples", 0),
+            "fallbacks": stats.get("infeasible", 0),
+            "margin": self.margin,
+            "source": self.source,
+        }
+
+    def _play_randomout(self, sim_state):
         """Simula la partita fino alla fine usando mosse casuali ma VALIDE"""
-        while sim_round.state == RoundState.PLAYING:
-            current_p = sim_round.players[sim_round.current_turn_index]
+        tricks = sim_state.rollout(self.rng)
+        return {p.name: tricks[i] for i, p in enumerate(self.real_round.players)}
 
-            # Usa il metodo del Round per ottenere mosse legali (senza eccezioni)
-            valid_moves = sim_round.get_valid_moves(current_p)
+    def _open_cards_bid(self):
+        """
+        1 carta + modalità carte scoperte: vedo le carte degli avversari ma non la mia.
+        Provo OGNI carta che potrei avere e conto in quanti casi vinco la mano.
+        """
+        num_players = len(self.real_round.players)
+        start_idx = self.real_round.first_player_index
+        trump = suit_to_int(self.real_round.trump_suit)
+        trump_card = self.real_round.trump_card_object
+
+        # Mano ipotetica nell'ordine di gioco, -1 al mio posto
+        trick = []
+        for i in range(num_players):
+            player = self.real_round.players[(start_idx + i) % num_players]
+            trick.append(-1 if player.name == self.bot_name else card_to_int(player.hand[0]))
+        my_pos = trick.index(-1)
+
+        key = ('open', trump, card_to_int(trump_card) if trump_card else -1, tuple(trick))
+        win_probability = _bid_cache_get(key)
+        if win_probability is None:
+            # Tutte le carte che POTREI avere: il mazzo meno quelle che vedo già in gioco
+            visible = set(trick)
+            if trump_card:
+                visible.add(card_to_int(trump_card))
+            possible_my_cards = [c for c in range(NUM_CARDS) if c not in visible]
 
-            # Valutare se aggiungere regole aggiuntive
-            card_to_play = random.choice(valid_moves)
+            wins = 0
+            for my_card in possible_my_cards:
+                trick[my_pos] = my_card
+                if winning_index(trick, trump) == my_pos:
+                    wins += 1
+            win_probability = wins / len(possible_my_cards) if possible_my_cards else 0
+            _bid_cache_put(key, win_probability)
 
-            # Gioca la carta usando il motore reale
-            sim_round.play_card(current_p.name, card_to_play)
-        return {p.name: sim_round.tricks_won[p.name] for p in sim_round.players}
+        print(f"[AI {self.bot_name}] Probabilità vittoria: {win_probability:.2%}")
 
-    def calculate_optimal_bid(self):
+        self.source = 'open_cards'
+        self.margin = round(abs(win_probability - 0.5), 4)
+        # Se ho più del 50% di chance, scommetto 1.
+        return 1 if win_probability > 0.5 else 0
+
+    def _estimate_tricks(self, samples):
+        """Prese attese: media dei rollout su `samples` distribuzioni casuali delle carte degli avversari"""
+        num_players = len(self.real_round.players)
+        cards_per_player = self.real_round.cards_per_player
+
+        known = {card_to_int(c) for c in self.my_player.hand}
+        if self.real_round.trump_card_object:
+            known.add(card_to_int(self.real_round.trump_card_object))
+        unknown = [c for c in range(NUM_CARDS) if c not in known]
+
+        base = SimState(num_players, suit_to_int(self.real_round.trump_suit))
+        base.hands[self.my_seat] = mask_of(self.my_player.hand)
+        base.turn = self.real_round.first_player_index
+        base.tricks_left = cards_per_player
+
+        sim_states = []
+        for _ in range(samples):
+            sim_state = base.copy()
+            self.rng.shuffle(unknown)
+            pos = 0
+            for seat in range(num_players):
+                if seat != self.my_seat:
+                    sim_state.hands[seat] = mask_of_ints(unknown[pos:pos + cards_per_player])
+                    pos += cards_per_player
+            sim_states.append(sim_state)
+
+        return sum(self._rollout_batch(sim_states)) / samples
+
+    def calculate_optimal_bid(self, samples=200, use_table=True):
         """
-        Calcola la scommessa basandosi sulla forza statistica della mano.
+        Calcola la scommessa come numero di prese atteso.
+        Prima si guarda la tabella precalcolata (ai_bid_table), poi si stima con `samples` rollout.
+        Le stime sono in cache sotto una firma canonica della mano, quindi situazioni
+        equivalenti (anche a semi permutati) si risolvono senza simulare.
         """
         # --- CASO SPECIALE: 1 Carta + Modalità Carte Scoperte ---
         if self.real_round.cards_per_player == 1 and self.real_round.open_cards_mode:
-            # 1. Identifichiamo le carte visibili (Trump + Avversari)
-            visible_cards_ids = set()
-
-            # Briscola
-            if self.real_round.trump_card_object:
-                visible_cards_ids.add(str(self.real_round.trump_card_object))
-
-            # Carte che vedo sulla fronte degli avversari
-            opponents_cards_map = {}
-            for p in self.real_round.players:
-                if p.name != self.bot_name and p.hand:
-                    card = p.hand[0]
-                    visible_cards_ids.add(str(card))
-                    opponents_cards_map[p.name] = card
-
-            # 2. Generiamo tutte le carte che POTREI avere io
-            # (Tutto il mazzo meno quelle che vedo già in gioco)
-            full_deck = create_deck()
-            possible_my_cards = [c for c in full_deck if str(c) not in visible_cards_ids]
-            print(visible_cards_ids)
-            wins = 0
-            total_scenarios = len(possible_my_cards)
+            return self._open_cards_bid()
 
-            # 3. Simuliamo la mano per OGNI carta che potrei avere
-            start_idx = self.real_round.first_player_index
-            num_players = len(self.real_round.players)
-            trump_suit = self.real_round.trump_suit
+        num_players = len(self.real_round.players)
+        cards = [card_to_int(c) for c in self.my_player.hand]
+        trump = suit_to_int(self.real_round.trump_suit)
+        seat = (self.my_seat - self.real_round.dealer_index) % num_players
+
+        expected_tricks = None
+        # La tabella vale solo a inizio round (mano completa, nessuna carta giocata)
+        if use_table and len(cards) == self.real_round.cards_per_player and not self.real_round.played_cards_history:
+            expected_tricks = ai_bid_table.lookup(cards, trump, num_players, seat)
+            self.source = 'table'
+
+        key = hand_signature(cards, trump, num_players, seat)
+        if expected_tricks is None:
+            expected_tricks = _bid_cache_get(key)
+            self.source = 'cache'
+        if expected_tricks is None:
+            expected_tricks = self._estimate_tricks(samples)
+            self.source = 'rollouts'
+            _bid_cache_put(key, expected_tricks)
+
+        # Distanza dal confine di arrotondamento: vicino a 0 la scommessa è in bilico
+        self.margin = round(0.5 - abs(expected_tricks - round(expected_tricks)), 4)
 
-            for my_card in possible_my_cards:
-                # Costruiamo il trick ipotetico nell'ordine corretto di gioco
-                trick_cards = []
-
-                for i in range(num_players):
-                    current_player_idx = (start_idx + i) % num_players
-                    player = self.real_round.players[current_player_idx]
-
-                    if player.name == self.bot_name:
-                        # In questa simulazione, ipotizzo di avere 'my_card'
-                        trick_cards.append(my_card)
-                    else:
-                        # Per gli altri, uso la carta che vedo realmente
-                        trick_cards.append(opponents_cards_map[player.name])
-
-                # Chi vince questa simulazione?
-                winner_rel_idx = winning_card(trick_cards, trump_suit)
-                winner_abs_idx = (start_idx + winner_rel_idx) % num_players
-                winner_name = self.real_round.players[winner_abs_idx].name
-
-                if winner_name == self.bot_name:
-                    wins += 1
+        # Arrotondamento statistico
+        predicted_tricks = round(expected_tricks)
+        # Correzione logica: Non scommettere mai più del numero di carte in mano
+        return min(predicted_tricks, len(self.my_player.hand))
 
-            # 4. Calcolo Probabilità
-            win_probability = wins / total_scenarios if total_scenarios > 0 else 0
+    def _rollout_batch(self, sim_states):
+        """Completa a caso tutti gli stati e ritorna le prese del bot per ognuno"""
+        self.rollouts += len(sim_states)
+        if self._endgame_solver is not None:
+            return [self._endgame_solver.solve(sim_state)[self.my_seat] for sim_state in sim_states]
+        if self.rollout_backend == 'numpy':
+            if self._np_rng is None:
+                self._np_rng = ai_batch.np.random.default_rng(self.rng.getrandbits(64))
+            return ai_batch.batch_rollouts(sim_states, self._np_rng)[:, self.my_seat].tolist()
+        return [self._play_randomout(sim_state)[self.bot_name] for sim_state in sim_states]
+
+    @staticmethod
+    def _reward(tricks_won, target_prediction):
+        """Semplice funzione di reward: grande bonus se faccio la mia bid, penalità per la distanza"""
+        if tricks_won == target_prediction:
+            return 10
+        return -abs(tricks_won - target_prediction) * 5
+
+    @staticmethod
+    def _prune_candidates(active, stats, confidence):
+        """
+        Scarta le carte chiaramente peggiori: quelle il cui limite superiore di confidenza
+        è sotto il limite inferiore della carta migliore.
+        """
+        bounds = {}
+        for card_str, _ in active:
+            n, total, total_sq = stats[card_str]
+            if not n:
+                # Mai simulata (deadline scaduta a metà batch): non si può giudicare
+                bounds[card_str] = (float('-inf'), float('inf'))
+                continue
+            mean = total / n
+            variance = max(total_sq / n - mean * mean, 0.0)
+            margin = confidence * math.sqrt(variance / n)
+            bounds[card_str] = (mean - margin, mean + margin)
+
+        best_lower = max(low for low, _ in bounds.values())
+        return [item for item in active if bounds[item[0]][1] >= best_lower]
+
+    def _run_simulations(self, candidates, simulations, shared_worlds, deadline, batch_size, confidence):
+        """
+        Ciclo di simulazione di choose_best_card.
+        candidates: lista di (str(card), card_int)
+        Ritorna (stats, attive): per ogni carta [simulazioni, somma reward, somma reward^2]
+        e le carte sopravvissute alla potatura.
+        """
+        self._prepare_simulation()
+        target_prediction = self.real_round.bids.get(self.bot_name, 0)
+        active = list(candidates)
 
-            print(f"[AI {self.bot_name}] Probabilità vittoria: {win_probability:.2%}")
+        # Finale: albero piccolo, ogni mondo determinizzato si risolve in modo esatto.
+        # Senza il rumore dei rollout bastano molti meno mondi.
+        if len(self.my_player.hand) <= self.endgame_cards:
+            self._endgame_solver = EndgameSolver([self.real_round.bids.get(p.name, 0) for p in self.real_round.players])
+            simulations = min(simulations, self.ENDGAME_WORLDS)
 
-            # 5. Decisione: Se ho più del 50% di chance, scommetto 1.
-            if win_probability > 0.5:
-                return 1
-            else:
-                return 0
+        stats = {card_str: [0, 0, 0] for card_str, _ in active}
 
-        trump = self.real_round.trump_suit
-        total_strength = 0.0
+        done = 0
+        timed_out = False
+        while done < simulations and len(active) > 1 and not timed_out:
+            n = min(batch_size, simulations - done)
 
-        num_players = len(self.real_round.players)
+            # 1. Crea le situazioni ipotetiche del batch (condivise fra le carte se shared_worlds)
+            worlds = [self._determinize_round() for _ in range(n)] if shared_worlds else None
 
-        # Fattore di affollamento: più giocatori ci sono, meno valgono le carte alte non-briscola
-        crowd_factor = 1.0 if num_players <= 4 else 0.8
-
-        for card in self.my_player.hand:
-            strength = 0.0
-
-            if card.type == CardType.WIZARD:
-                strength = 1.0
-
-            elif card.type == CardType.JESTER:
-                strength = 0.0
-
-            elif card.type == CardType.NUMBER:
-                val = card.value
-
-                # Se è briscola
-                if trump and card.suit == trump:
-                    if val >= 11:
-                        strength = 0.95  # J, Q, K
-                    elif val >= 8:
-                        strength = 0.7
-                    elif val >= 5:
-                        strength = 0.4
-                    else:
-                        strength = 0.1
-
-                # Se non è briscola (e non c'è "Nessuna briscola")
-                elif trump is not None:
-                    if val == 13:
-                        strength = 0.7 * crowd_factor
-                    elif val == 12:
-                        strength = 0.5 * crowd_factor
-                    elif val == 11:
-                        strength = 0.2 * crowd_factor
-                    else:
-                        strength = 0.0
-
-                # Se non c'è briscola (Round Jester o ultima carta mazzo finita)
+            for card_str, card_int in active:
+                if shared_worlds:
+                    sim_states = [world.copy() for world in worlds]
                 else:
-                    if val >= 12:
-                        strength = 0.85
-                    elif val >= 10:
-                        strength = 0.6
-                    elif val >= 8:
-                        strength = 0.3
-                    else:
-                        strength = 0.0
+                    sim_states = [self._determinize_round() for _ in range(n)]
 
-            total_strength += strength
+                # 2. Io gioco QUESTA carta specifica
+                for sim_state in sim_states:
+                    sim_state.play(card_int)
+
+                # 3. Gli altri giocano a caso fino alla fine, 4. Punteggio
+                card_stats = stats[card_str]
+                for tricks_won in self._rollout_batch(sim_states):
+                    reward = self._reward(tricks_won, target_prediction)
+                    card_stats[0] += 1
+                    card_stats[1] += reward
+                    card_stats[2] += reward * reward
+
+                if deadline is not None and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
 
-        # Arrotondamento statistico
-        predicted_tricks = round(total_strength)
-        # Correzione logica: Non scommettere mai più del numero di carte in mano
-        return min(predicted_tricks, len(self.my_player.hand))
+            done += n
+            active = self._prune_candidates(active, stats, confidence)
+
+        return stats, [card_str for card_str, _ in active]
 
-    def choose_best_card(self, simulations):
+    def _run_parallel_simulations(self, candidates, simulations, workers, deadline_at, options):
+        """
+        Divide le simulazioni di una decisione fra `workers` processi.
+        Ogni worker ha il proprio seed; le statistiche vengono sommate alla fine.
+        deadline_at: scadenza assoluta (time.time()) o None, così serializzazione, coda e
+        avvio dei processi rientrano nel budget
+        """
+        pool = _get_simulation_pool(workers)
+        futures = [pool.submit(_simulation_worker, *args)
+                   for args in self._shard_jobs(candidates, simulations, workers, deadline_at, options)]
+        return self._merge_shards(candidates, [future.result() for future in futures])
+
+    def _shard_jobs(self, candidates, simulations, workers, deadline_at, options):
+        """Argomenti di _simulation_worker per ogni pezzo della decisione, ognuno col proprio seed"""
+        snapshot = pickle.dumps(self.real_round, protocol=pickle.HIGHEST_PROTOCOL)
+        bot_options = {"rollout_backend": self.rollout_backend, "endgame_cards": self.endgame_cards}
+        share, extra = divmod(simulations, workers)
+        jobs = []
+        for i in range(workers):
+            worker_sims = share + (1 if i < extra else 0)
+            if worker_sims == 0:
+                continue
+            seed = self.rng.getrandbits(64)
+            jobs.append((snapshot, self.bot_name, candidates, worker_sims, seed, deadline_at, options, bot_options))
+        return jobs
+
+    @staticmethod
+    def _merge_shards(candidates, results):
+        """Somma le statistiche dei pezzi; restano attive le carte sopravvissute in almeno un pezzo"""
+        stats = {card_str: [0, 0, 0] for card_str, _ in candidates}
+        active = set()
+        for worker_stats, worker_active in results:
+            for card_str, values in worker_stats.items():
+                merged = stats[card_str]
+                for k in range(3):
+                    merged[k] += values[k]
+            active.update(worker_active)
+
+        return stats, [card_str for card_str, _ in candidates if card_str in active]
+
+    def choose_best_card(self, simulations, shared_worlds=True, deadline_ms=None, batch_size=10, confidence=2.0,
+                         workers=1):
         """
         Per ogni carta valida nella mia mano:
         1. Giocala in un round clonato.
         2. Simula il resto della partita N volte a caso.
         3. Conta quante volte raggiungo la mia prediction.
+
+        shared_worlds: se True ogni mondo determinizzato viene costruito una volta sola
+        e tutte le carte candidate vengono valutate sullo stesso mondo (common random numbers).
+        Se False ogni coppia (carta, simulazione) usa un mondo diverso.
+
+        deadline_ms: tempo massimo; allo scadere ritorna la carta migliore trovata finora.
+        Ogni batch_size simulazioni le carte chiaramente peggiori (intervalli di confidenza
+        a `confidence` deviazioni standard) vengono scartate; con una sola carta rimasta ci si ferma.
+
+        workers: se > 1 le simulazioni vengono divise fra più processi, ognuno col proprio seed.
+        Dentro un processo figlio (es. il pool delle decisioni del server) si resta su un solo processo:
+        niente pool annidati, i processi in tutto restano quelli del pool esterno.
         """
+        # La deadline parte da qui, prima di qualsiasi preparazione
+        start_wall = time.time()
+        start = time.perf_counter()
         # Ottieni mosse valide dal round reale
         valid_moves = self.real_round.get_valid_moves(self.my_player)
 
         if not valid_moves: return self.my_player.hand[0]  # Fallback
-        if len(valid_moves) == 1: return valid_moves[0]  # Scelta obbligata
-
-        scores = {str(card): 0 for card in valid_moves}
-        target_prediction = self.real_round.bids.get(self.bot_name, 0)
-
-        for card in valid_moves:
-            for _ in range(simulations):
-                # 1. Crea situazione ipotetica
-                sim_round = self._determinize_round()
-
-                # 2. Io gioco QUESTA carta specifica
-                try:
-                    sim_round.play_card(self.bot_name, card)
-                except Exception as e:
-                    # Se per qualche motivo la generazione random crea uno stato impossibile
-                    continue
-
-                    # 3. Gli altri giocano a caso fino alla fine
-                results = self._play_randomout(sim_round)
-
-                # 4. Punteggio
-                tricks_won = results.get(self.bot_name, 0)
-
-                # Semplice funzione di reward:
-                if tricks_won == target_prediction:
-                    scores[str(card)] += 10  # Grande bonus se faccio la mia bid
-                else:
-                    diff = abs(tricks_won - target_prediction)
-                    scores[str(card)] -= (diff * 5)  # Penalità per la distanza
-
-        # Trova la carta col punteggio migliore
-        best_card_str = max(scores, key=scores.get)
+        if len(valid_moves) == 1:  # Scelta obbligata
+            self.source = 'forced'
+            return valid_moves[0]
+
+        candidates = [(str(card), card_to_int(card)) for card in valid_moves]
+        options = {"shared_worlds": shared_worlds, "batch_size": batch_size, "confidence": confidence}
+
+        if workers > 1 and multiprocessing.parent_process() is not None:
+            workers = 1
+
+        if workers > 1:
+            deadline_at = (start_wall + deadline_ms / 1000 - _PARALLEL_COLLECT_MARGIN
+                           if deadline_ms is not None else None)
+            stats, active = self._run_parallel_simulations(candidates, simulations, workers, deadline_at, options)
+        else:
+            deadline = start + deadline_ms / 1000 if deadline_ms is not None else None
+            stats, active = self._run_simulations(candidates, simulations, deadline=deadline, **options)
+
+        return self._best_from_stats(valid_moves, stats, active)
+
+    def _best_from_stats(self, valid_moves, stats, active):
+        """Carta col reward medio migliore fra quelle rimaste; aggiorna i contatori per ai_stats"""
+        # Con più worker i rollout sono avvenuti altrove: si contano dalle statistiche
+        self.rollouts = sum(n for n, _, _ in stats.values())
+        self.source = 'endgame' if self._endgame_solver is not None else 'rollouts'
+
+        # Trova la carta col punteggio medio migliore fra quelle rimaste
+        evaluated = [card_str for card_str in active if stats[card_str][0]]
+        if not evaluated:
+            return valid_moves[0]
+        best_card_str = max(evaluated, key=lambda cs: stats[cs][1] / stats[cs][0])
+
+        # Margine: reward medio della carta scelta meno quello della seconda migliore valutata
+        means = sorted((stats[cs][1] / stats[cs][0] for cs in stats if stats[cs][0]), reverse=True)
+        self.margin = round(means[0] - means[1], 4) if len(means) > 1 else None
 
         # Ritorna l'oggetto carta corrispondente
         for c in valid_moves:
             if str(c) == best_card_str:
                 return c
 
-        return valid_moves[0]
\ No newline at end of file
+        return valid_moves[0]
+
+
+def montecarlo_settings(ai_config):
+    """
+    Parametri di MonteCarloBot e di choose_best_card presi da ai_config, con i default del gioco.
+    Ritorna (opzioni del bot, opzioni della ricerca).
+    """
+    backend = ai_config.get('rollout_backend', 'python')
+    bot_options = {"rollout_backend": backend, "endgame_cards": ai_config.get('endgame_cards', 2)}
+    search_options = {
+        "simulations": ai_config.get('simulations', 100),
+        "deadline_ms": ai_config.get('deadline_ms'),
+        "batch_size": ai_config.get('batch_size', 100 if backend == 'numpy' else 10),
+        "workers": ai_config.get('workers', 1),
+    }
+    return bot_options, search_options
+
+
+class SplitCardDecision:
+    """
+    Scelta di una carta di MonteCarloBot divisa in pezzi indipendenti da eseguire in un pool esterno.
+    Il server crea i pezzi dal suo event loop e li manda al pool delle decisioni, così i processi
+    restano quelli del pool (niente pool annidati) e più worker lavorano sulla stessa mossa.
+
+    Uso: jobs() -> argomenti per _simulation_worker (None se non conviene dividere), poi finish(risultati).
+    """
+
+    def __init__(self, real_round, player_name, seed):
+        self.start = time.perf_counter()
+        start_wall = time.time()
+        self.real_round = real_round
+        self.player_name = player_name
+        bot_options, self.search = montecarlo_settings(real_round.ai_config)
+        self.bot = MonteCarloBot(player_name, real_round, rng=random.Random(seed), **bot_options)
+        deadline_ms = self.search['deadline_ms']
+        self.deadline_at = start_wall + deadline_ms / 1000 - _PARALLEL_COLLECT_MARGIN if deadline_ms is not None else None
+        self.valid_moves = None
+        self.candidates = None
+
+    def jobs(self):
+        workers = self.search['workers']
+        bot = self.bot
+        # Mossa obbligata o finale risolto in modo esatto: pochi calcoli, si decide in un solo processo
+        if workers <= 1 or len(bot.my_player.hand) <= bot.endgame_cards:
+            return None
+        self.valid_moves = self.real_round.get_valid_moves(bot.my_player)
+        if len(self.valid_moves) <= 1:
+            return None
+        self.candidates = [(str(card), card_to_int(card)) for card in self.valid_moves]
+        options = {"shared_worlds": True, "batch_size": self.search['batch_size'], "confidence": 2.0}
+        return bot._shard_jobs(self.candidates, self.search['simulations'], workers, self.deadline_at, options)
+
+    @staticmethod
+    def run_job(*args):
+        """Eseguito nel pool: un pezzo della decisione, con gli argomenti ritornati da jobs()"""
+        return _simulation_worker(*args)
+
+    def finish(self, results):
+        """Unisce i pezzi, registra la decisione in ai_stats e ritorna la carta come dict"""
+        stats, active = MonteCarloBot._merge_shards(self.candidates, results)
+        best_card = self.bot._best_from_stats(self.valid_moves, stats, active)
+        ai_stats.record_decision('card', self.real_round, self.player_name, 'montecarlo',
+                                 time.perf_counter() - self.start, bot=self.bot, choice=str(best_card))
+        return best_card.to_dict()
+
+
+# Pool di processi per le decisioni parallele (uno per processo, creato alla prima richiesta)
+_simulation_pool = None
+_simulation_pool_size = 0
+
+
+def _get_simulation_pool(workers):
+    global _simulation_pool, _simulation_pool_size
+    if _simulation_pool is None or _simulation_pool_size < workers:
+        if _simulation_pool is not None:
+            _simulation_pool.shutdown(wait=False)
+        _simulation_pool = ProcessPoolExecutor(max_workers=workers)
+        _simulation_pool_size = workers
+    return _simulation_pool
+
+
+def _simulation_worker(round_snapshot, bot_name, candidates, simulations, seed, deadline_at, options, bot_options):
+    """
+    Eseguito in un worker: simula una parte della decisione con un RNG indipendente.
+    deadline_at: scadenza assoluta decisa dal processo principale (time.time()), o None
+    """
+    real_round = pickle.loads(round_snapshot)
+    bot = MonteCarloBot(bot_name, real_round, rng=random.Random(seed), **bot_options)
+    deadline = time.perf_counter() + (deadline_at - time.time()) if deadline_at is not None else None
+    return bot._run_simulations(candidates, simulations, deadline=deadline, **options)
+
+
+def bot_decision_task(kind, round_snapshot, player_name, ponder=None, seed=None):
+    """
+    Eseguito in un processo del pool del server.
+    round_snapshot: il Round serializzato con pickle nel momento della richiesta
+    ponder: (albero serializzato, carte giocate) di una ricerca anticipata ISMCTS, da proseguire
+    seed: seme per il generatore del round nel worker (la copia serializzata non avanza quello originale)
+    Ritorna (decisione, record di ai_stats): la scommessa (kind='bid') o la carta da giocare
+    come dict (kind='card').
+    """
+    real_round = pickle.loads(round_snapshot)
+    if seed is not None:
+        real_round.rng = random.Random(seed)
+    player = next(p for p in real_round.players if p.name == player_name)
+
+    if kind == 'bid':
+        decision = real_round.get_bot_prediction(player)
+    elif kind == 'card':
+        search_root = None
+        if ponder is not None:
+            # Import locale: ai_ismcts importa questo modulo
+            from ai_ismcts import resume_tree
+            search_root = resume_tree(real_round, *ponder)
+        decision = real_round.get_bot_card_to_play(player, search_root=search_root)
+    else:
+        raise ValueError(f"Tipo di decisione sconosciuto: {kind}")
+    # Il record resta nel buffer del worker: lo si rimanda al processo principale
+    return decision, ai_stats.DECISIONS[-1]
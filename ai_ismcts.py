@@ -0,0 +1,179 @@
+# ai_ismcts.py
+"""
+Information Set Monte Carlo Tree Search (single observer).
+
+L'albero è costruito dal punto di vista del bot: ogni nodo è una sequenza di mosse
+osservabili. A ogni iterazione si determinizza di nuovo il mondo, si scende
+nell'albero con UCB considerando solo le mosse legali in quel mondo
+(conteggio delle "disponibilità"), si espande un nodo e si finisce con un rollout.
+"""
+import math
+import pickle
+import random
+import time
+from ai_engine import MonteCarloBot
+from ai_sim import bits, card_to_int, bid_reward
+
+
+class Node:
+    __slots__ = ('move', 'parent', 'seat', 'children', 'visits', 'avails', 'reward')
+
+    def __init__(self, move=None, parent=None, seat=None):
+        self.move = move      # Carta (int) giocata per arrivare qui
+        self.parent = parent
+        self.seat = seat      # Chi ha giocato la mossa: il reward è dal suo punto di vista
+        self.children = {}
+        self.visits = 0
+        self.avails = 1
+        self.reward = 0.0
+
+    def ucb_score(self, exploration):
+        return self.reward / self.visits + exploration * math.sqrt(math.log(self.avails) / self.visits)
+
+
+class ISMCTSBot(MonteCarloBot):
+    def __init__(self, bot_name, real_round, exploration=0.7, rng=None):
+        super().__init__(bot_name, real_round, rng=rng)
+        self.exploration = exploration
+        # Le scommesse di tutti sono note in fase PLAYING: ogni giocatore massimizza la propria
+        self.seat_bids = [real_round.bids.get(p.name, 0) for p in real_round.players]
+
+    @staticmethod
+    def _decided(root, remaining):
+        """True se la mossa più visitata non può più essere superata con le iterazioni rimaste"""
+        if len(root.children) < 2:
+            return False
+        first, second = sorted((n.visits for n in root.children.values()), reverse=True)[:2]
+        return first - second > remaining
+
+    def search(self, iterations, root=None, deadline_ms=None, stop_when_decided=True):
+        """
+        Esegue le iterazioni e ritorna la radice dell'albero.
+        La ricerca è anytime: si ferma allo scadere di deadline_ms o quando la scelta alla radice è già decisa.
+        root: albero di una ricerca precedente (es. anticipata) da proseguire
+        """
+        self._prepare_simulation()
+        if root is None:
+            root = Node()
+
+        exploration = self.exploration
+        bids = self.seat_bids
+        deadline = time.perf_counter() + deadline_ms / 1000 if deadline_ms is not None else None
+
+        for i in range(iterations):
+            if i % 10 == 0 and i:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if stop_when_decided and self._decided(root, iterations - i):
+                    break
+
+            state = self._determinize_round()
+            node = root
+
+            # 1. SELEZIONE: scendo finché tutte le mosse legali del mondo attuale sono già espanse
+            untried = None
+            while not state.is_over:
+                legal = bits(state.valid_moves())
+                children = node.children
+                untried = [m for m in legal if m not in children]
+
+                for m in legal:
+                    child = children.get(m)
+                    if child is not None:
+                        child.avails += 1
+
+                if untried:
+                    break
+
+                node = max((children[m] for m in legal), key=lambda n: n.ucb_score(exploration))
+                state.play(node.move)
+
+            # 2. ESPANSIONE
+            if untried and not state.is_over:
+                move = self.rng.choice(untried)
+                child = Node(move, node, state.turn)
+                node.children[move] = child
+                state.play(move)
+                node = child
+
+            # 3. ROLLOUT
+            tricks = state.rollout(self.rng)
+            self.rollouts += 1
+
+            # 4. BACKPROPAGATION
+            while node.parent is not None:
+                node.visits += 1
+                node.reward += bid_reward(tricks[node.seat], bids[node.seat])
+                node = node.parent
+            node.visits += 1
+
+        return root
+
+    def choose_best_card(self, iterations=300, deadline_ms=None, root=None):
+        # Ottieni mosse valide dal round reale
+        valid_moves = self.real_round.get_valid_moves(self.my_player)
+
+        if not valid_moves: return self.my_player.hand[0]  # Fallback
+        if len(valid_moves) == 1:  # Scelta obbligata
+            self.source = 'forced'
+            return valid_moves[0]
+
+        root = self.search(iterations, root=root, deadline_ms=deadline_ms)
+
+        # La mossa più visitata è la più robusta
+        legal = {card_to_int(c): c for c in valid_moves}
+        ranked = sorted((n for m, n in root.children.items() if m in legal), key=lambda n: n.visits, reverse=True)
+        if not ranked:
+            return valid_moves[0]
+        best = ranked[0]
+
+        self.source = 'ismcts'
+        if len(ranked) > 1 and ranked[1].visits:
+            # Margine: reward medio della mossa scelta meno quello della seconda più visitata
+            self.margin = round(best.reward / best.visits - ranked[1].reward / ranked[1].visits, 4)
+        return legal[best.move]
+
+
+# --- Ricerca anticipata (pondering) ---
+# Mentre tocca a un umano il server fa cercare in anticipo il prossimo bot sullo stesso
+# information set. L'albero viaggia serializzato fra i processi del pool insieme al numero
+# di carte giocate quando è stato costruito; quando arrivano le carte vere si scende nel
+# sottoalbero corrispondente e il resto viene scartato.
+
+def played_moves(real_round) -> list[int]:
+    """Carte giocate nel round, in ordine, come interi"""
+    return [card_to_int(c) for c in real_round.played_cards_history + real_round.current_trick]
+
+
+def reroot(root, moves):
+    """Scende nell'albero seguendo le carte giocate; None se una di esse non era stata esplorata"""
+    node = root
+    for m in moves:
+        node = node.children.get(m)
+        if node is None:
+            return None
+    node.parent = None
+    return node
+
+
+def resume_tree(real_round, tree, ply):
+    """Albero anticipato (serializzato, costruito dopo `ply` carte) riportato allo stato attuale del round"""
+    moves = played_moves(real_round)
+    if ply > len(moves):
+        return None
+    return reroot(pickle.loads(tree), moves[ply:])
+
+
+def ponder_task(round_snapshot, bot_name, tree, ply, iterations, seed=None):
+    """
+    Eseguito in un processo del pool del server: prosegue la ricerca anticipata di bot_name
+    per `iterations` iterazioni sul round fotografato.
+    Ritorna (albero serializzato, carte giocate, visite della radice).
+    """
+    real_round = pickle.loads(round_snapshot)
+    root = resume_tree(real_round, tree, ply) if tree is not None else None
+
+    bot = ISMCTSBot(bot_name, real_round, rng=random.Random(seed))
+    # Alla radice muovono gli avversari: la scelta "decisa" non ha senso, si usano tutte le iterazioni
+    root = bot.search(iterations, root=root, stop_when_decided=False)
+    return pickle.dumps(root, protocol=pickle.HIGHEST_PROTOCOL), len(played_moves(real_round)), root.visits
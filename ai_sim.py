@@ -0,0 +1,290 @@
+# ai_sim.py
+"""
+Stato compatto per le simulazioni dell'AI.
+
+Le carte sono interi 0..59, le mani sono bitmask e lo stato della mano
+(turno, seme di uscita, carta vincente) è tenuto in pochi interi.
+Così un rollout non deve copiare oggetti Round né creare liste di Card.
+
+La codifica delle carte è quella di engine.card (card_to_int) e la carta vincente
+si aggiorna con la tabella engine.trick.BEATS.
+"""
+import random
+from engine.card import NUM_CARDS, FIRST_WIZARD, FIRST_JESTER, NO_SUIT, card_to_int, suit_to_int
+from engine.trick import BEATS
+
+# Seme di uscita non ancora deciso (finora solo Jester sul tavolo)
+LEAD_PENDING = -1
+
+SUIT_MASKS = [((1 << 13) - 1) << (13 * i) for i in range(4)]
+WIZARD_MASK = 0b1111 << FIRST_WIZARD
+JESTER_MASK = 0b1111 << FIRST_JESTER
+SPECIAL_MASK = WIZARD_MASK | JESTER_MASK
+
+
+def mask_of(cards) -> int:
+    mask = 0
+    for c in cards:
+        mask |= 1 << card_to_int(c)
+    return mask
+
+
+def mask_of_ints(codes) -> int:
+    mask = 0
+    for c in codes:
+        mask |= 1 << c
+    return mask
+
+
+def bits(mask: int) -> list[int]:
+    """Lista degli interi-carta presenti nella bitmask"""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def bid_reward(tricks_won: int, bid: int) -> float:
+    """Reward di un giocatore a fine round: 1.0 se centra la scommessa, -0.5 per ogni presa di scarto"""
+    if tricks_won == bid:
+        return 1.0
+    return -0.5 * abs(tricks_won - bid)
+
+
+class SimState:
+    """
+    Stato di un round in fase PLAYING ridotto a interi.
+    I posti (seat) sono gli indici in Round.players.
+    """
+    __slots__ = ('num_players', 'hands', 'trump', 'turn', 'lead', 'trick_len',
+                 'best_seat', 'best_card', 'tricks', 'tricks_left')
+
+    def __init__(self, num_players: int, trump: int):
+        self.num_players = num_players
+        self.hands = [0] * num_players
+        self.trump = trump
+        self.turn = 0
+        self.lead = LEAD_PENDING
+        self.trick_len = 0
+        self.best_seat = 0
+        self.best_card = -1
+        self.tricks = [0] * num_players
+        self.tricks_left = 0
+
+    @classmethod
+    def from_round(cls, real_round, seat: int) -> "SimState":
+        """
+        Fotografa il round reale dal punto di vista del giocatore `seat`:
+        solo la sua mano è nota, quelle degli altri restano vuote (vanno determinizzate).
+        """
+        players = real_round.players
+        state = cls(len(players), suit_to_int(real_round.trump_suit))
+        state.hands[seat] = mask_of(players[seat].hand)
+        state.tricks = [real_round.tricks_won.get(p.name, 0) for p in players]
+        state.tricks_left = real_round.cards_per_player - real_round.tricks_completed
+
+        if real_round.trick_order:
+            state.turn = players.index(real_round.trick_order[0])
+            for card in real_round.current_trick:
+                state.play(card_to_int(card))
+        else:
+            state.turn = real_round.current_turn_index
+        return state
+
+    def copy(self) -> "SimState":
+        new = SimState.__new__(SimState)
+        new.num_players = self.num_players
+        new.hands = self.hands[:]
+        new.trump = self.trump
+        new.turn = self.turn
+        new.lead = self.lead
+        new.trick_len = self.trick_len
+        new.best_seat = self.best_seat
+        new.best_card = self.best_card
+        new.tricks = self.tricks[:]
+        new.tricks_left = self.tricks_left
+        return new
+
+    @property
+    def is_over(self) -> bool:
+        return self.tricks_left == 0
+
+    def valid_moves(self) -> int:
+        """Bitmask delle carte giocabili dal giocatore di turno"""
+        hand = self.hands[self.turn]
+        lead = self.lead
+        if 0 <= lead < NO_SUIT:
+            follow = hand & SUIT_MASKS[lead]
+            if follow:
+                return follow | (hand & SPECIAL_MASK)
+        return hand
+
+    def play(self, c: int):
+        """Gioca la carta c per il giocatore di turno (nessuna validazione)"""
+        seat = self.turn
+        self.hands[seat] &= ~(1 << c)
+
+        lead = self.lead
+        if lead == LEAD_PENDING:
+            if c < FIRST_WIZARD:
+                lead = self.lead = c // 13
+            elif c < FIRST_JESTER:
+                lead = self.lead = NO_SUIT
+
+        best = self.best_card
+        if best < 0 or BEATS[((self.trump * 5 + (lead if lead >= 0 else NO_SUIT)) * NUM_CARDS + best) * NUM_CARDS + c]:
+            self.best_card = c
+            self.best_seat = seat
+
+        self.trick_len += 1
+        if self.trick_len == self.num_players:
+            winner = self.best_seat
+            self.tricks[winner] += 1
+            self.tricks_left -= 1
+            self.turn = winner
+            self.lead = LEAD_PENDING
+            self.trick_len = 0
+            self.best_card = -1
+        else:
+            self.turn = (seat + 1) % self.num_players
+
+    def rollout(self, rng=random) -> list[int]:
+        """Gioca mosse casuali ma valide fino alla fine; ritorna le prese per posto"""
+        while self.tricks_left:
+            self.play(rng.choice(bits(self.valid_moves())))
+        return self.tricks
+
+
+# Gruppi di carte per i vincoli di distribuzione: i 4 semi + Wizard/Jester (sempre ammessi)
+SPECIAL_GROUP = 4
+ALL_GROUPS = 0b11111
+
+
+def card_group(c: int) -> int:
+    return c // 13 if c < FIRST_WIZARD else SPECIAL_GROUP
+
+
+class DealSampler:
+    """
+    Distribuisce le carte ignote agli avversari rispettando sempre i semi che sappiamo mancare,
+    senza tentativi ripetuti.
+
+    Le carte mescolate vengono assegnate una alla volta a chi può riceverle, con probabilità
+    proporzionale alle carte che gli mancano (senza vincoli è esattamente una distribuzione
+    uniforme, con vincoli ci va molto vicino). Prima di ogni assegnazione si controlla la condizione di Hall sui gruppi di carte:
+    per ogni insieme di gruppi G, le carte richieste da chi può ricevere solo carte di G non devono
+    superare quelle di G ancora da distribuire. Così non si arriva mai a un vicolo cieco.
+    Le carte che non vanno a nessun avversario restano nel mazzo (un ricevente senza vincoli).
+    """
+
+    def __init__(self, unknown, needs, voids):
+        """
+        unknown: carte ignote (interi)
+        needs: {seat: carte da dare}
+        voids: {seat: insieme di semi (indici 0..3) che il giocatore non ha}
+        """
+        self.unknown = list(unknown)
+        self.seats = list(needs)
+        deck_need = len(self.unknown) - sum(needs.values())
+        self.base_need = [needs[s] for s in self.seats] + [deck_need]
+
+        # Gruppi ammessi per ogni ricevente (l'ultimo è il mazzo)
+        self.allowed = []
+        for seat in self.seats:
+            mask = ALL_GROUPS
+            for suit in voids.get(seat, ()):
+                mask &= ~(1 << suit)
+            self.allowed.append(mask)
+        self.allowed.append(ALL_GROUPS)
+
+        self.constrained = any(a != ALL_GROUPS for a in self.allowed)
+        self.stats = {"samples": 0, "tight_samples": 0, "blocked_choices": 0, "infeasible": 0}
+
+        if not self.constrained:
+            return
+
+        # Insiemi di gruppi rilevanti: quelli che contengono tutti i gruppi ammessi di un giocatore vincolato
+        relevant = set()
+        for a in self.allowed:
+            if a != ALL_GROUPS:
+                for g_set in range(ALL_GROUPS):
+                    if g_set & a == a:
+                        relevant.add(g_set)
+        self.relevant = sorted(relevant)
+
+        supply = [0] * (SPECIAL_GROUP + 1)
+        for c in self.unknown:
+            supply[card_group(c)] += 1
+        self.base_slack = {}
+        for g_set in self.relevant:
+            have = sum(supply[g] for g in range(SPECIAL_GROUP + 1) if g_set >> g & 1)
+            need = sum(n for n, a in zip(self.base_need, self.allowed) if a & g_set == a)
+            self.base_slack[g_set] = have - need
+
+        if min(self.base_slack.values()) < 0:
+            # Informazioni incoerenti: nessuna distribuzione rispetta i vincoli
+            print("[AI WARNING] Vincoli sui semi impossibili da rispettare, li ignoro")
+            self.constrained = False
+            self.stats["infeasible"] = 1
+            return
+
+        # critical[r][g]: insiemi la cui slack scende di 1 se una carta del gruppo g va al ricevente r
+        self.critical = [[[g_set for g_set in self.relevant if g_set >> g & 1 and a & g_set != a]
+                          for g in range(SPECIAL_GROUP + 1)]
+                         for a in self.allowed]
+        self.receivers_for_group = [[r for r, a in enumerate(self.allowed) if a >> g & 1]
+                                    for g in range(SPECIAL_GROUP + 1)]
+        self.groups = {c: card_group(c) for c in self.unknown}
+
+    def sample(self, rng=random):
+        """Ritorna {seat: bitmask della mano} per ogni avversario"""
+        stats = self.stats
+        stats["samples"] += 1
+        cards = self.unknown[:]
+        rng.shuffle(cards)
+
+        if not self.constrained:
+            hands = {}
+            pos = 0
+            for seat, need in zip(self.seats, self.base_need):
+                hands[seat] = mask_of_ints(cards[pos:pos + need])
+                pos += need
+            return hands
+
+        need = self.base_need[:]
+        slack = dict(self.base_slack)
+        masks = [0] * len(need)
+        critical = self.critical
+        forced = 0
+
+        for c in cards:
+            g = self.groups[c]
+            options = []
+            total = 0
+            for r in self.receivers_for_group[g]:
+                if not need[r]:
+                    continue
+                if all(slack[g_set] >= 1 for g_set in critical[r][g]):
+                    options.append(r)
+                    total += need[r]
+                else:
+                    forced += 1
+
+            # Scelta proporzionale alle carte che mancano a ciascuno
+            pick = rng.random() * total
+            for r in options:
+                pick -= need[r]
+                if pick < 0:
+                    break
+
+            need[r] -= 1
+            masks[r] |= 1 << c
+            for g_set in critical[r][g]:
+                slack[g_set] -= 1
+
+        if forced:
+            stats["tight_samples"] += 1
+            stats["blocked_choices"] += forced
+        return dict(zip(self.seats, masks))
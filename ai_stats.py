@@ -0,0 +1,75 @@
+# ai_stats.py
+"""
+Registro delle decisioni dei bot.
+
+Ogni decisione (scommessa, carta, scelta della briscola) produce un record con tempo,
+simulazioni, rollout/s e margine della scelta; gli ultimi MAX_RECORDS restano in memoria
+in un buffer circolare. Nel server le decisioni girano nel pool di processi: il worker
+ritorna il record insieme alla decisione e il processo principale lo registra qui.
+"""
+import time
+from collections import deque
+
+MAX_RECORDS = 2000
+
+DECISIONS = deque(maxlen=MAX_RECORDS)
+
+
+def record(entry: dict) -> dict:
+    DECISIONS.append(entry)
+    return entry
+
+
+def record_decision(kind, real_round, player_name, engine, wall_time, bot=None, choice=None) -> dict:
+    """
+    Costruisce e registra il record di una decisione.
+    kind: 'bid', 'card' o 'trump'; wall_time in secondi; bot: il MonteCarloBot/ISMCTSBot usato (se c'è)
+    """
+    entry = {
+        "time": time.time(),
+        "kind": kind,
+        "engine": engine,
+        "bot": player_name,
+        "players": len(real_round.players),
+        "cards_per_player": real_round.cards_per_player,
+        "hand_size": len(next(p.hand for p in real_round.players if p.name == player_name)),
+        "wall_ms": round(wall_time * 1000, 3),
+        "choice": choice,
+    }
+    if bot is not None:
+        entry.update(bot.profile())
+        rollouts = entry.get("rollouts", 0)
+        entry["rollouts_per_s"] = round(rollouts / wall_time, 1) if wall_time > 0 else None
+    return record(entry)
+
+
+def last(n: int | None = None) -> list[dict]:
+    """Gli ultimi n record (tutti se n è None), dal più vecchio al più recente"""
+    records = list(DECISIONS)
+    if n is None:
+        return records
+    return records[-n:] if n > 0 else []
+
+
+def summary() -> list[dict]:
+    """Medie per (tipo, giocatori, carte a testa): dove va il tempo dei bot"""
+    groups = {}
+    for entry in DECISIONS:
+        key = (entry["kind"], entry["players"], entry["cards_per_player"])
+        g = groups.setdefault(key, {"count": 0, "wall_ms": 0.0, "rollouts": 0})
+        g["count"] += 1
+        g["wall_ms"] += entry["wall_ms"]
+        g["rollouts"] += entry.get("rollouts", 0)
+
+    out = []
+    for (kind, players, cards), g in sorted(groups.items()):
+        out.append({
+            "kind": kind,
+            "players": players,
+            "cards_per_player": cards,
+            "count": g["count"],
+            "total_ms": round(g["wall_ms"], 1),
+            "mean_ms": round(g["wall_ms"] / g["count"], 3),
+            "mean_rollouts": round(g["rollouts"] / g["count"], 1),
+        })
+    return out
@@ -13,25 +13,101 @@ class CardType(Enum):
     WIZARD = auto()
     JESTER = auto()
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Card:
+    """
+    Le 60 carte esistono una volta sola (INT_TO_CARD): create_deck mescola quelle,
+    la copia o il pickle di una carta ritorna l'istanza canonica.
+    Codice intero, stringa e dict vengono calcolati alla creazione.
+    """
     type: CardType
     suit: Suit | None = None
     value: int | None = None
     id: int | None = None
 
-    def __str__(self):
+    def __post_init__(self):
+        # Campi di cache: il dataclass è frozen, quindi si impostano con object.__setattr__
+        object.__setattr__(self, 'code', _card_code(self))
+        object.__setattr__(self, '_str', self._format())
+        object.__setattr__(self, '_dict', {
+            "type": self.type.name,
+            "suit": self.suit.name if self.suit else None,
+            "value": self.value,
+            "id": self.id,
+            "display": self._str  # Utile per debug o display rapido
+        })
+
+    def _format(self):
         if self.type == CardType.WIZARD:
             return f"WIZARD-{self.id}"
         if self.type == CardType.JESTER:
             return f"JESTER-{self.id}"
         return f"{self.suit.name}-{self.value}"
 
+    def __str__(self):
+        return self._str
+
     def to_dict(self):
-        return {
-            "type": self.type.name,
-            "suit": self.suit.name if self.suit else None,
-            "value": self.value,
-            "id": self.id,
-            "display": str(self)  # Utile per debug o display rapido
-        }
+        """Dict per il frontend. È condiviso fra tutte le chiamate: non va modificato."""
+        return self._dict
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Card) and self.code == other.code)
+
+    def __hash__(self):
+        return self.code
+
+    def __reduce__(self):
+        return card_from_int, (self.code,)
+
+
+# --- Codifica intera delle carte (tabelle di engine.trick e simulazioni dell'AI) ---
+# 0..51  -> numeri, seme * 13 + (valore - 1)  (CUORI=0, QUADRI=1, FIORI=2, PICCHE=3)
+# 52..55 -> Wizard con id 0..3
+# 56..59 -> Jester con id 0..3
+NUM_CARDS = 60
+FIRST_WIZARD = 52
+FIRST_JESTER = 56
+# Indice "seme" per Wizard/Jester e per l'assenza di briscola o di seme di uscita
+NO_SUIT = 4
+
+SUITS = [Suit.CUORI, Suit.QUADRI, Suit.FIORI, Suit.PICCHE]
+SUIT_INDEX = {s: i for i, s in enumerate(SUITS)}
+
+
+def card_to_int(card: Card) -> int:
+    return card.code
+
+
+def card_from_int(code: int) -> Card:
+    return INT_TO_CARD[code]
+
+
+def _card_code(card: Card) -> int:
+    if card.type == CardType.WIZARD:
+        return FIRST_WIZARD + card.id
+    if card.type == CardType.JESTER:
+        return FIRST_JESTER + card.id
+    return SUIT_INDEX[card.suit] * 13 + card.value - 1
+
+
+def suit_to_int(suit: Suit | None) -> int:
+    return NO_SUIT if suit is None else SUIT_INDEX[suit]
+
+
+def _build_cards():
+    cards = [Card(CardType.NUMBER, suit, value) for suit in SUITS for value in range(1, 14)]
+    cards += [Card(CardType.WIZARD, id=i) for i in range(4)]
+    cards += [Card(CardType.JESTER, id=i) for i in range(4)]
+    return cards
+
+
+INT_TO_CARD = _build_cards()
+
+# Indice per le carte che arrivano dal frontend: (tipo, seme, valore, id) -> carta canonica
+CARD_INDEX = {(c.type.name, c.suit.name if c.suit else None, c.value, c.id): c for c in INT_TO_CARD}
+
+
+def card_from_dict(card_dict: dict) -> Card | None:
+    """Carta canonica descritta da un dict come quello di Card.to_dict (None se non esiste)"""
+    return CARD_INDEX.get((card_dict.get('type'), card_dict.get('suit'), card_dict.get('value'), card_dict.get('id')))
@@ -1,17 +1,17 @@
 import random
-from .card import Card, Suit, CardType
+from .card import Card, INT_TO_CARD, FIRST_WIZARD, FIRST_JESTER
 
+# Ordine storico del mazzo prima di mescolare (semi, poi Wizard e Jester alternati):
+# a parità di seme si ottengono le stesse distribuzioni di prima
+_DECK_ORDER = INT_TO_CARD[:FIRST_WIZARD] + [INT_TO_CARD[first + i] for i in range(4)
+                                            for first in (FIRST_WIZARD, FIRST_JESTER)]
 
-def create_deck() -> list[Card]:
-    deck = []
 
-    for suit in Suit:
-        for value in range(1, 14):
-            deck.append(Card(CardType.NUMBER, suit, value))
-
-    for i in range(4):
-        deck.append(Card(CardType.WIZARD, id=i))
-        deck.append(Card(CardType.JESTER, id=i))
-
-    random.shuffle(deck)
+def create_deck(rng=None) -> list[Card]:
+    """
+    Mazzo mescolato delle 60 carte canoniche (nessuna nuova istanza di Card).
+    rng: generatore casuale (random.Random) con cui mescolare; di default il modulo random
+    """
+    deck = list(_DECK_ORDER)
+    (rng or random).shuffle(deck)
     return deck
@@ -1,4 +1,7 @@
+import json
+import random
 from engine.player import Player
+from engine.summary import RoundSummary
 from .enums import Suit, CardType, RoundState
 
 
@@ -15,8 +18,15 @@ class Game:
         for p in self.players:
             p.score = 0
         self.dealer_index = 0
-        self.rounds = []
-        self.round_history = []
+        # Solo il round in corso resta un Round completo; quelli finiti diventano RoundSummary
+        self.current_round = None
+        self._current_round_archived = False
+        self.archive: list[RoundSummary] = []
+        # Storico nel formato del frontend, solo in append; la versione cambia quando si archivia un round
+        self._history = []
+        self.history_version = 0
+        # [chiave, lista, json]: riusato finché non finisce un round (vedi get_history)
+        self._history_cache = None
 
         self.chat = []
 
@@ -31,6 +41,12 @@ class Game:
 
         self.first_round_open_cards = config.get('first_round_open_cards', False)
         self.max_players = config.get('max_players', len(player_names))
+        # Impostazioni dei bot, passate a ogni Round (motore di ricerca, budget...)
+        self.ai_config = config.get('ai', {})
+        # Seme della partita (None = casuale): ogni round riceve un generatore derivato da questo
+        self.rng = random.Random(config.get('seed'))
+        # Se True i riassunti dei round conservano anche le carte giocate (replay)
+        self.keep_move_log = config.get('move_log', False)
 
         print(f"[GAME] Inizializzato con {len(self.players)} giocatori: {[p.name for p in self.players]}")
         print(
@@ -42,20 +58,18 @@ class Game:
             return self.selected_rounds[self.current_round_index]
         return 0
 
+    @property
+    def round_history(self):
+        """Storico dei round finiti nel formato del frontend (da non modificare)"""
+        return self._history
+
     def _create_round_summary(self, round_obj, round_num):
-        round_data = {
-            "round_num": round_num,
-            "players_data": []
-        }
-        for p in self.players:
-            round_data["players_data"].append({
-                "name": p.name,
-                "prediction": round_obj.bids.get(p.name, 0),
-                "tricks_won": round_obj.tricks_won.get(p.name, 0),
-                "score": p.score,
-                "points_earned": round_obj.points_earned.get(p.name, 0)
-            })
-        return round_data
+        return RoundSummary.from_round(round_obj, round_num, self.players, keep_moves=self.keep_move_log)
+
+    def _archive_round(self, summary):
+        self.archive.append(summary)
+        self._history.append(summary.to_dict())
+        self.history_version += 1
 
     def start_next_round(self):
         num_players = len(self.players)
@@ -63,14 +77,15 @@ class Game:
             print("[GAME] Nessun giocatore!")
             return False
 
-        if self.rounds:
-            last_round = self.rounds[-1]
+        if self.current_round is not None:
+            last_round = self.current_round
             print(f"[GAME] Ultimo round stato: {last_round.state}")
 
             if last_round.state == RoundState.FINISHED:
-                round_data = self._create_round_summary(last_round, self.round_number)
-                self.round_history.append(round_data)
-                print(f"[GAME] Storico salvato per round {self.round_number}")
+                if not self._current_round_archived:
+                    self._archive_round(self._create_round_summary(last_round, self.round_number))
+                    self._current_round_archived = True
+                    print(f"[GAME] Storico salvato per round {self.round_number}")
 
                 self.current_round_index += 1
                 self.dealer_index = (self.dealer_index + 1) % num_players
@@ -91,8 +106,11 @@ class Game:
         print(
             f"[GAME] Creazione round {next_round_num} ({self.current_round_index + 1}/{len(self.selected_rounds)}) con {cards_to_deal} carte")
         from engine.round import Round
-        new_round = Round(self.players, cards_to_deal, self.dealer_index, open_cards_mode=is_open_mode)
-        self.rounds.append(new_round)
+        new_round = Round(self.players, cards_to_deal, self.dealer_index, open_cards_mode=is_open_mode,
+                          ai_config=self.ai_config, rng=random.Random(self.rng.getrandbits(64)))
+        # Il round precedente è già nell'archivio: qui si tiene solo quello nuovo
+        self.current_round = new_round
+        self._current_round_archived = False
 
         new_round.setup()
         print(f"[GAME] Setup completato, stato: {new_round.state}")
@@ -104,22 +122,41 @@ class Game:
             p.score = 0
             p.hand = []
         self.dealer_index = 0
-        self.rounds = []
-        self.round_history = []
+        self.current_round = None
+        self._current_round_archived = False
+        self.archive = []
+        self._history = []
+        self.history_version += 1
+        self._history_cache = None
         self.current_round_index = 0
         self.chat = []  # Reset chat
 
-    def get_history(self):
-        history = list(self.round_history)
-        if self.rounds:
-            last_round = self.rounds[-1]
-            if last_round.state == RoundState.FINISHED:
-                current_num = self.round_number
-                if not any(r['round_num'] == current_num for r in history):
-                    temp_data = self._create_round_summary(last_round, current_num)
-                    history.append(temp_data)
+    def _live_round_pending(self):
+        """True se il round in corso è finito ma non ancora archiviato"""
+        last_round = self.current_round
+        return last_round is not None and last_round.state == RoundState.FINISHED and not self._current_round_archived
 
-        return history
+    def get_history(self):
+        """
+        Storico per il frontend. La lista è in cache e si ricostruisce solo quando cambia la versione
+        o quando il round in corso finisce; chi la riceve non deve modificarla.
+        """
+        # Il round appena finito compare subito, anche prima di passare al successivo
+        live = self.current_round if self._live_round_pending() else None
+        key = (self.history_version, id(live) if live is not None else None)
+        if self._history_cache is None or self._history_cache[0] != key:
+            history = self._history
+            if live is not None:
+                history = history + [self._create_round_summary(live, self.round_number).to_dict()]
+            self._history_cache = [key, history, None]
+        return self._history_cache[1]
+
+    def get_history_json(self):
+        """Come get_history, ma già serializzato in JSON (calcolato una volta per versione)"""
+        history = self.get_history()
+        if self._history_cache[2] is None:
+            self._history_cache[2] = json.dumps(history)
+        return self._history_cache[2]
 
     def is_creator(self, player_name):
         return player_name == self.creator
@@ -1,16 +1,22 @@
 from engine.deck import create_deck
-from engine.card import Card, CardType, Suit
-from engine.trick import winning_card
+from engine.card import Card, CardType, Suit, SUIT_INDEX, card_from_dict, suit_to_int
+from engine.trick import beats
 from .enums import RoundState
 import random
+import time
 
 
 class Round:
-    def __init__(self, players, cards_per_player: int, dealer_index: int, open_cards_mode: bool = False):
+    def __init__(self, players, cards_per_player: int, dealer_index: int, open_cards_mode: bool = False,
+                 ai_config: dict | None = None, rng: random.Random | None = None):
         self.players = players
         self.cards_per_player = cards_per_player
         self.dealer_index = dealer_index
         self.open_cards_mode = open_cards_mode
+        # Impostazioni dei bot (es. {"engine": "ismcts", "iterations": 300})
+        self.ai_config = ai_config or {}
+        # Generatore casuale del round: mazzo e bot ne derivano i propri, niente stato globale
+        self.rng = rng if rng is not None else random.Random()
 
         # Stato del gioco
         self.state = RoundState.BIDDING
@@ -34,9 +40,19 @@ class Round:
         self.played_cards_history = []  # Memoria di tutte le carte giocate in questo round
         self.missing_suits = {p.name: set() for p in players}
 
+        # Indici aggiornati a ogni carta: carte numeriche per seme di ogni giocatore,
+        # seme di uscita della mano in corso e carte ancora in mano in totale
+        self.suit_counts = {p.name: [0, 0, 0, 0] for p in players}
+        self.lead_suit: Suit | None = None
+        self.lead_decided = False  # False finché sul tavolo ci sono solo Jester
+        self.cards_left = 0
+        # Carta vincente della mano in corso (codice intero, -1 = tavolo vuoto) e sua posizione nel trick
+        self.trick_best_code = -1
+        self.trick_best_index = 0
+
     def setup(self):
         """Distribuisce carte e determina lo stato iniziale"""
-        deck = create_deck()
+        deck = create_deck(self.rng)
         self._punti_gia_fatti = False
 
         for p in self.players:
@@ -51,6 +67,7 @@ class Round:
 
         for p in self.players:
             p.sort_hand()
+        self._index_hands()
 
         # Determinazione Briscola
         if deck:
@@ -72,36 +89,34 @@ class Round:
         self.state = RoundState.BIDDING
         self.current_turn_index = self.first_player_index
 
+    def _index_hands(self):
+        """Ricostruisce gli indici delle mani dopo la distribuzione"""
+        self.suit_counts = {p.name: [0, 0, 0, 0] for p in self.players}
+        for p in self.players:
+            counts = self.suit_counts[p.name]
+            for c in p.hand:
+                if c.type == CardType.NUMBER:
+                    counts[SUIT_INDEX[c.suit]] += 1
+        self.lead_suit = None
+        self.lead_decided = False
+        self.trick_best_code = -1
+        self.trick_best_index = 0
+        self.cards_left = sum(len(p.hand) for p in self.players)
+
+    def _must_follow(self, player) -> bool:
+        """True se c'è un seme di uscita e il giocatore ne ha almeno una carta"""
+        return self.lead_suit is not None and self.suit_counts[player.name][SUIT_INDEX[self.lead_suit]] > 0
+
     def get_valid_moves(self, player) -> list[Card]:
         """
         Restituisce la lista di carte giocabili da un giocatore nello stato attuale.
         Fondamentale per l'AI e per la validazione delle mosse.
+        Il seme di uscita (lead_suit) è None a inizio mano, dopo un Wizard
+        (vince il primo Wizard, nessun obbligo di risposta) o se finora ci sono solo Jester.
         """
-        # Se è il primo a giocare, tutto è valido
-        if not self.current_trick:
-            return list(player.hand)
-
-        # 1. Determina il seme dominante (Lead Suit)
-        lead_suit = None
-        for c in self.current_trick:
-            if c.type == CardType.WIZARD:
-                # Se c'è un Wizard, il seme non conta (vince il primo Wizard),
-                # quindi non c'è obbligo di risposta
-                lead_suit = None
-                break
-            if c.type == CardType.NUMBER:
-                lead_suit = c.suit
-                break
-            # Se è Jester, continuiamo a cercare il prossimo
-
-        # Se non c'è lead suit (es. tutti Jester o primo è Wizard), tutto è valido
-        if lead_suit is None:
-            return list(player.hand)
-
-        # 2. Controlla se il giocatore ha carte del seme dominante
-        has_suit = any(c.suit == lead_suit and c.type == CardType.NUMBER for c in player.hand)
-
-        if has_suit:
+        lead_suit = self.lead_suit
+
+        if self._must_follow(player):
             # Deve rispondere a seme, OPPURE giocare Wizard o Jester (che sono sempre validi)
             return [c for c in player.hand if
                     (c.type == CardType.NUMBER and c.suit == lead_suit) or
@@ -110,43 +125,43 @@ class Round:
         # Se non ha il seme, può giocare qualsiasi carta
         return list(player.hand)
 
-    def _calculate_missing_suits(self):
+    def _update_trick_state(self, player, card):
         """
-        Analizza la storia del round per capire quali semi mancano agli avversari.
-        Ritorna: dict {player_name: set(Suit)}
+        Aggiorna lo stato della mano in corso con la carta appena giocata:
+        seme di uscita, carta vincente finora e semi che sappiamo mancare al giocatore.
         """
-        if len(self.current_trick) < 2:
-            return
+        # Il seme di uscita lo decide la prima carta che non è un Jester (un Wizard = nessun seme)
+        if not self.lead_decided and card.type != CardType.JESTER:
+            self.lead_decided = True
+            self.lead_suit = card.suit if card.type == CardType.NUMBER else None
 
-        # 1. Determina il seme dominante (Lead Suit)
-        lead_suit = None
-        for c in self.current_trick:
-            if c.type == CardType.WIZARD:
-                lead_suit = None
-                break
-            if c.type == CardType.NUMBER:
-                lead_suit = c.suit
-                break
-
-        # Se non c'è lead suit (es. tutti Jester o primo è Wizard), tutto è valido
-        if lead_suit is None:
-            return
+        # Una carta numerica di un altro seme vuol dire che il giocatore non ha il seme di uscita
+        if self.lead_suit is not None and card.type == CardType.NUMBER and card.suit != self.lead_suit:
+            self.missing_suits[player.name].add(self.lead_suit)
 
-        # 2. Controlla se il giocatore non ha carte del seme dominante
-        for i in self.current_trick:
-            if i.type == CardType.NUMBER and i.suit != lead_suit:
-                index = self.current_trick.index(i)
-                self.missing_suits[self.trick_order[index].name].add(lead_suit)
+        # Carta vincente: stesse regole di winning_card, una carta alla volta con trick.beats
+        if self.trick_best_code < 0 or beats(card.code, self.trick_best_code, suit_to_int(self.lead_suit),
+                                             suit_to_int(self.trump_suit)):
+            self.trick_best_code = card.code
+            self.trick_best_index = len(self.current_trick) - 1
+
+    def _bot_rng(self):
+        """Generatore indipendente per una decisione di un bot, derivato da quello del round"""
+        return random.Random(self.rng.getrandbits(64))
 
     def get_bot_prediction(self, player):
         # Import locale per evitare circular import
         from ai_engine import MonteCarloBot
+        import ai_stats
+        start = time.perf_counter()
 
         # Passiamo l'intero oggetto Round (self) al bot
-        ai = MonteCarloBot(player.name, self)
+        ai = MonteCarloBot(player.name, self, rng=self._bot_rng(),
+                           rollout_backend=self.ai_config.get('rollout_backend', 'python'))
 
-        # Simulazioni rapide per la fase di scommessa
-        prediction = ai.calculate_optimal_bid()
+        # Tabella precalcolata, altrimenti simulazioni rapide (in cache per situazioni equivalenti)
+        prediction = ai.calculate_optimal_bid(samples=self.ai_config.get('bid_samples', 200),
+                                              use_table=self.ai_config.get('bid_table', True))
 
         # Regola del +/- 1 per l'ultimo giocatore (il Dealer o chi parla per ultimo)
         is_last_bidder = (self.current_turn_index == self.dealer_index)
@@ -161,21 +176,39 @@ class Round:
                 else:
                     prediction += 1
 
+        ai_stats.record_decision('bid', self, player.name, 'montecarlo', time.perf_counter() - start,
+                                 bot=ai, choice=prediction)
         return prediction
 
-    def get_bot_card_to_play(self, player):
-        from ai_engine import MonteCarloBot
-
-        ai = MonteCarloBot(player.name, self)
-
-        # Usa Monte Carlo per scegliere la carta migliore
-        best_card = ai.choose_best_card(simulations=100)
-
+    def get_bot_card_to_play(self, player, search_root=None):
+        """search_root: albero ISMCTS già costruito (ricerca anticipata) da cui ripartire"""
+        import ai_stats
+        engine = self.ai_config.get('engine', 'montecarlo')
+        start = time.perf_counter()
+
+        if engine == 'ismcts':
+            from ai_ismcts import ISMCTSBot
+            ai = ISMCTSBot(player.name, self, rng=self._bot_rng())
+            # Ricerca ad albero sugli information set
+            best_card = ai.choose_best_card(iterations=self.ai_config.get('iterations', 300),
+                                            deadline_ms=self.ai_config.get('deadline_ms'),
+                                            root=search_root)
+        else:
+            from ai_engine import MonteCarloBot, montecarlo_settings
+            bot_options, search_options = montecarlo_settings(self.ai_config)
+            ai = MonteCarloBot(player.name, self, rng=self._bot_rng(), **bot_options)
+            # Usa Monte Carlo per scegliere la carta migliore (batch più grandi per i rollout NumPy)
+            best_card = ai.choose_best_card(**search_options)
+
+        ai_stats.record_decision('card', self, player.name, engine, time.perf_counter() - start,
+                                 bot=ai, choice=str(best_card))
         return best_card.to_dict()
 
     def get_bot_trump_choice(self, player):
         """Sceglie il seme di briscola per il bot (se esce Wizard come briscola)."""
-        counts = {s: 0 for s in Suit if s != Suit.NESSUNO}
+        import ai_stats
+        start = time.perf_counter()
+        counts = {s: 0 for s in Suit}
 
         has_cards = False
         for card in player.hand:
@@ -184,12 +217,12 @@ class Round:
                 has_cards = True
 
         # Se ha carte numeriche, sceglie il seme più frequente
-        if has_cards:
-            best_suit = max(counts, key=counts.get)
-            return best_suit
-
         # Se ha solo Wizard/Jester, sceglie a caso (es. Cuori)
-        return Suit.CUORI
+        best_suit = max(counts, key=counts.get) if has_cards else Suit.CUORI
+
+        ai_stats.record_decision('trump', self, player.name, 'heuristic', time.perf_counter() - start,
+                                 choice=best_suit.name)
+        return best_suit
 
     def set_trump_suit(self, suit: Suit):
         if self.state != RoundState.WAITING_FOR_DEALER_TRUMP:
@@ -254,9 +287,12 @@ class Round:
         current_player.hand.remove(card_obj)
         self.current_trick.append(card_obj)
         self.trick_order.append(current_player)
+        self.cards_left -= 1
+        if card_obj.type == CardType.NUMBER:
+            self.suit_counts[current_player.name][SUIT_INDEX[card_obj.suit]] -= 1
 
-        # Aggiorno lista semi assenti nei giocatori
-        self._calculate_missing_suits()
+        # Seme di uscita, carta vincente e semi assenti, solo dalla carta appena giocata
+        self._update_trick_state(current_player, card_obj)
 
         if len(self.current_trick) == 1:
             self.last_trick_winner = None
@@ -267,29 +303,18 @@ class Round:
             self.current_turn_index = (self.current_turn_index + 1) % len(self.players)
 
     def _validate_move(self, player, card_to_play):
-        """Valida se la mossa è legale usando get_valid_moves"""
-        valid_moves = self.get_valid_moves(player)
-
-        # Controlliamo se la carta è nella lista delle mosse valide.
-        # Poiché Card è frozen=True, il confronto funziona correttamente.
-        if card_to_play not in valid_moves:
-            # Ricostruiamo il motivo per dare un messaggio di errore chiaro al frontend
-            lead_suit = None
-            for c in self.current_trick:
-                if c.type == CardType.NUMBER:
-                    lead_suit = c.suit
-                    break
-                if c.type == CardType.WIZARD:
-                    break
-
-            raise Exception(f"Mossa non valida! Devi rispondere al seme {lead_suit.name if lead_suit else 'dominante'}")
+        """Valida se la mossa è legale (stesse regole di get_valid_moves, in tempo costante)"""
+        if card_to_play.type != CardType.NUMBER or card_to_play.suit == self.lead_suit:
+            return
+        if self._must_follow(player):
+            raise Exception(f"Mossa non valida! Devi rispondere al seme {self.lead_suit.name}")
 
     def _resolve_trick(self):
         # Salva la mano corrente per il frontend prima di pulirla
         self.last_trick = list(self.current_trick)
 
-        winner_idx = winning_card(self.current_trick, self.trump_suit)
-        winner = self.trick_order[winner_idx]
+        # La carta vincente è già nota dallo stato incrementale della mano
+        winner = self.trick_order[self.trick_best_index]
 
         self.tricks_won[winner.name] += 1
         self.tricks_completed += 1
@@ -301,12 +326,15 @@ class Round:
         # Pulisci per la prossima mano
         self.current_trick = []
         self.trick_order = []
+        self.lead_suit = None
+        self.lead_decided = False
+        self.trick_best_code = -1
+        self.trick_best_index = 0
 
         leader_idx_global = self.players.index(winner)
         self.current_turn_index = leader_idx_global
 
-        cards_remaining = sum(len(p.hand) for p in self.players)
-        if cards_remaining == 0:
+        if self.cards_left == 0:
             self.state = RoundState.FINISHED
 
     def calculate_scores(self):
@@ -329,18 +357,14 @@ class Round:
         self._punti_gia_fatti = True
 
     def _find_card_in_hand(self, player, card_dict):
-        for c in player.hand:
-            if c.type.name == card_dict['type']:
-                if c.type == CardType.NUMBER:
-                    if c.value == card_dict['value'] and c.suit.name == card_dict['suit']:
-                        return c
-                elif c.type in [CardType.WIZARD, CardType.JESTER]:
-                    # Per Wizard e Jester controlliamo l'ID se presente, altrimenti il tipo basta
-                    # (Nel tuo codice originale controllavi solo il tipo, qui affiniamo)
-                    target_id = card_dict.get('id')
-                    if target_id is not None:
-                        if c.id == target_id:
-                            return c
-                    else:
-                        return c
+        # Indice O(1) delle carte canoniche, poi controllo che sia davvero in mano
+        card = card_from_dict(card_dict)
+        if card is not None:
+            if card in player.hand:
+                return card
+        elif card_dict.get('type') in (CardType.WIZARD.name, CardType.JESTER.name) and card_dict.get('id') is None:
+            # Wizard/Jester senza ID: basta il tipo
+            for c in player.hand:
+                if c.type.name == card_dict['type']:
+                    return c
         raise Exception(f"Carta non trovata in mano a {player.name}")
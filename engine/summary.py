@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class RoundSummary:
+    """
+    Riassunto immutabile di un round finito: è tutto ciò che la partita conserva dei round passati.
+    Le tuple per giocatore seguono l'ordine di Game.players.
+    moves: opzionale, le carte giocate in ordine come byte (codici di engine.card), utile per i replay
+    """
+    round_num: int
+    cards_per_player: int
+    dealer_index: int
+    trump: str | None
+    names: tuple
+    bids: tuple
+    tricks: tuple
+    points: tuple
+    scores: tuple
+    moves: bytes | None = None
+
+    @classmethod
+    def from_round(cls, round_obj, round_num, players, keep_moves=False):
+        return cls(
+            round_num=round_num,
+            cards_per_player=round_obj.cards_per_player,
+            dealer_index=round_obj.dealer_index,
+            trump=round_obj.trump_suit.name if round_obj.trump_suit else None,
+            names=tuple(p.name for p in players),
+            bids=tuple(round_obj.bids.get(p.name, 0) for p in players),
+            tricks=tuple(round_obj.tricks_won.get(p.name, 0) for p in players),
+            points=tuple(round_obj.points_earned.get(p.name, 0) for p in players),
+            scores=tuple(p.score for p in players),
+            moves=bytes(c.code for c in round_obj.played_cards_history) if keep_moves else None,
+        )
+
+    def to_dict(self):
+        """Formato di round_history usato dal frontend"""
+        return {
+            "round_num": self.round_num,
+            "players_data": [
+                {
+                    "name": name,
+                    "prediction": bid,
+                    "tricks_won": tricks,
+                    "score": score,
+                    "points_earned": points
+                }
+                for name, bid, tricks, score, points in zip(self.names, self.bids, self.tricks, self.scores, self.points)
+            ]
+        }
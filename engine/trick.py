@@ -1,5 +1,5 @@
 from typing import List
-from .card import Card, CardType, Suit
+from .card import Card, CardType, Suit, NUM_CARDS, FIRST_WIZARD, FIRST_JESTER, NO_SUIT, card_to_int, suit_to_int
 
 
 def winning_card(cards: List[Card], trump: Suit | None) -> int:
@@ -63,4 +63,75 @@ def winning_card(cards: List[Card], trump: Suit | None) -> int:
                 best_card = current_card
                 best_index = i
 
-    return best_index
\ No newline at end of file
+    return best_index
+
+def _beats(card: int, best: int, lead: int, trump: int) -> bool:
+    """
+    Stesse regole di winning_card su carte codificate come interi:
+    True se `card`, giocata dopo `best` (la migliore finora), diventa la nuova migliore.
+    """
+    if FIRST_WIZARD <= best < FIRST_JESTER:
+        return False  # Vince il primo Wizard
+    if FIRST_WIZARD <= card < FIRST_JESTER:
+        return True
+    if card >= FIRST_JESTER:
+        return False
+    if best >= FIRST_JESTER:
+        return True
+
+    card_suit, card_value = divmod(card, 13)
+    best_suit, best_value = divmod(best, 13)
+
+    # Caso Briscola (Trump)
+    if trump != NO_SUIT and card_suit == trump:
+        return best_suit != trump or card_value > best_value
+
+    # Caso Seme Dominante (Lead Suit)
+    if card_suit == lead:
+        if best_suit != lead and best_suit != trump:
+            return True
+        return best_suit == lead and card_value > best_value
+    return False
+
+
+# Tabella precalcolata di tutti i casi 60 x 60 x 5 x 5:
+# BEATS[((trump * 5 + lead) * 60 + best) * 60 + card] == 1 se `card` supera `best`
+BEATS = bytes(
+    _beats(card, best, lead, trump)
+    for trump in range(NO_SUIT + 1)
+    for lead in range(NO_SUIT + 1)
+    for best in range(NUM_CARDS)
+    for card in range(NUM_CARDS)
+)
+
+
+def beats(card: int, best: int, lead: int, trump: int) -> bool:
+    return BEATS[((trump * 5 + lead) * NUM_CARDS + best) * NUM_CARDS + card] == 1
+
+
+def winning_index(cards: List[int], trump: int) -> int:
+    """
+    Equivalente di winning_card su carte codificate (engine.card.card_to_int)
+    e briscola come intero (engine.card.suit_to_int). Ritorna l'indice della carta vincente.
+    """
+    # Il seme di uscita è quello della prima carta numerica
+    lead = NO_SUIT
+    for c in cards:
+        if c < FIRST_WIZARD:
+            lead = c // 13
+            break
+
+    base = (trump * 5 + lead) * NUM_CARDS
+    best_index = 0
+    best = cards[0]
+    for i in range(1, len(cards)):
+        c = cards[i]
+        if BEATS[(base + best) * NUM_CARDS + c]:
+            best = c
+            best_index = i
+    return best_index
+
+
+def winning_card_fast(cards: List[Card], trump: Suit | None) -> int:
+    """Come winning_card, ma risolto con la tabella BEATS"""
+    return winning_index([card_to_int(c) for c in cards], suit_to_int(trump))
@@ -1,5 +1,7 @@
-import uvicorn, json, asyncio, random, string, importlib
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response
+import uvicorn, json, asyncio, random, string, importlib, os, pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
@@ -9,6 +11,61 @@ importlib.reload(engine.game)
 from engine.game import Game
 from engine.enums import RoundState
 from engine.card import Suit
+from ai_engine import bot_decision_task, SplitCardDecision
+from ai_ismcts import ponder_task
+import ai_bid_table
+import ai_stats
+
+try:
+    import orjson  # Opzionale: serializzazione più veloce degli stati
+except ImportError:
+    orjson = None
+
+
+def dumps_json(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+# Code di invio per connessione: oltre questi limiti un client lento viene disconnesso (codice 1013)
+SEND_QUEUE_LIMIT = 32  # messaggi non di stato (errori, avvisi) in attesa
+SEND_TIMEOUT = 10.0    # secondi massimi per un singolo invio
+
+# Impostazioni dei bot nelle stanze, passate alla partita come config['ai'] (vedi Round.ai_config)
+DEFAULT_AI_CONFIG = {
+    'engine': 'montecarlo',  # 'ismcts' (a scelta in configure_lobby) abilita anche la ricerca anticipata
+    'ponder': True,          # solo con ISMCTS: i bot cercano mentre tocca a un umano (vedi start_pondering)
+    'deadline_ms': 1500,     # tempo massimo di ricerca per ogni carta
+    # Processi del pool su cui si divide una carta Monte Carlo (vedi GameManager.run_bot_decision)
+    'workers': max(1, min(4, (os.cpu_count() or 1) // 2)),
+}
+AI_ENGINES = ('montecarlo', 'ismcts')
+
+
+def lobby_ai_config(msg):
+    """Impostazioni dei bot scelte dal creatore in configure_lobby, sopra quelle di default"""
+    ai_config = dict(DEFAULT_AI_CONFIG)
+    if msg.get('engine') in AI_ENGINES:
+        ai_config['engine'] = msg['engine']
+    if msg.get('ponder') is not None:
+        ai_config['ponder'] = bool(msg['ponder'])
+    if msg.get('deadline_ms') is not None:
+        ai_config['deadline_ms'] = max(100, min(int(msg['deadline_ms']), 10000))
+    if msg.get('workers') is not None:
+        ai_config['workers'] = max(1, min(int(msg['workers']), os.cpu_count() or 1))
+    return ai_config
+
+
+def ponder_rng(current_round):
+    """
+    Generatore della ricerca anticipata, derivato dallo stato del round senza consumarne il generatore:
+    quanti blocchi girano dipende da quanto pensa l'umano, e non deve cambiare le decisioni successive.
+    """
+    fork = random.Random()
+    fork.setstate(current_round.rng.getstate())
+    return random.Random(f"ponder:{fork.getrandbits(64)}")
+
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
@@ -24,8 +81,166 @@ class GameManager:
         self.active_games = {}
         self.lobby_players = {}
         self.lobby_configs = {}
+        # Decisioni dei bot in corso per stanza (None = il bot sta "pensando" ma non ha ancora inviato il calcolo)
+        self.bot_futures = {}
+        self._bot_executor = None
+        # Pool separato e più piccolo per la ricerca anticipata: non ritarda le decisioni vere delle altre stanze
+        self._ponder_executor = None
+        # Ricerca anticipata dei bot mentre tocca a un umano (solo motore ISMCTS)
+        # room_id -> {"bot", "round", "tree", "ply", "visits", "rng"}
+        self.ponder = {}
+        self.ponder_tasks = {}
+
+    def get_bot_executor(self):
+        # Pool di processi creato alla prima mossa di un bot.
+        # Le scommesse si calcolano nei worker: ognuno carica la tabella all'avvio, con qualsiasi metodo di avvio
+        if self._bot_executor is None:
+            self._bot_executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                     initializer=ai_bid_table.load_bid_table)
+        return self._bot_executor
+
+    def get_ponder_executor(self):
+        if self._ponder_executor is None:
+            self._ponder_executor = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) // 4))
+        return self._ponder_executor
+
+    async def run_bot_decision(self, room_id, kind, current_round, player, ponder=None):
+        """
+        Calcola la decisione del bot in un processo separato, senza bloccare l'event loop.
+        Il round viene serializzato subito, quindi il worker lavora su una fotografia coerente.
+        ponder: albero della ricerca anticipata da proseguire (vedi take_ponder)
+        Ritorna None se la decisione è stata annullata (stanza chiusa).
+        """
+        # Il seme avanza il generatore del round qui: ogni decisione ha un flusso proprio e riproducibile
+        seed = current_round.rng.getrandbits(64)
+        loop = asyncio.get_running_loop()
+
+        # Carta Monte Carlo con più worker: i pezzi della stessa mossa vanno in parallelo nel pool
+        if kind == 'card' and current_round.ai_config.get('engine', 'montecarlo') == 'montecarlo':
+            split = SplitCardDecision(current_round, player.name, seed)
+            jobs = split.jobs()
+            if jobs:
+                future = asyncio.gather(*(loop.run_in_executor(self.get_bot_executor(), split.run_job, *args)
+                                          for args in jobs))
+                self.bot_futures[room_id] = future
+                await asyncio.wait({future})
+                if future.cancelled():
+                    return None
+                return split.finish(future.result())
+
+        snapshot = pickle.dumps(current_round, protocol=pickle.HIGHEST_PROTOCOL)
+        future = loop.run_in_executor(self.get_bot_executor(), bot_decision_task, kind, snapshot, player.name,
+                                      ponder, seed)
+        self.bot_futures[room_id] = future
+
+        # asyncio.wait non solleva CancelledError se è il future a essere annullato
+        await asyncio.wait({future})
+        if future.cancelled():
+            return None
+        decision, record = future.result()
+        # Il record della decisione arriva dal worker: lo si registra nel buffer del server.
+        # Niente codice della stanza: il buffer è pubblico (/ai/decisions) e il codice basta per entrare
+        record["pondered"] = ponder is not None
+        ai_stats.record(record)
+        return decision
+
+    def cancel_bot_decision(self, room_id):
+        future = self.bot_futures.pop(room_id, None)
+        if future is not None:
+            future.cancel()
+        # La ricerca anticipata si ferma da sola dopo il blocco in corso
+        self.ponder.pop(room_id, None)
+        self.ponder_tasks.pop(room_id, None)
+
+    def start_pondering(self, room_id, game, current_round):
+        """
+        Mentre tocca a un umano, il prossimo bot in ordine di gioco cerca in anticipo.
+        La ricerca gira a blocchi di poche iterazioni nel pool dedicato, uno alla volta per stanza,
+        e si ferma appena l'umano gioca o dopo `ponder_limit` visite.
+        """
+        ai_config = current_round.ai_config
+        if ai_config.get('engine') != 'ismcts' or not ai_config.get('ponder', True):
+            return
+        if current_round.state != RoundState.PLAYING:
+            return
+        task = self.ponder_tasks.get(room_id)
+        if task is not None and not task.done():
+            return
 
-    def get_game_state(self, room_id, player_id):
+        num_players = len(current_round.players)
+        bot_name = None
+        for offset in range(1, num_players):
+            p = current_round.players[(current_round.current_turn_index + offset) % num_players]
+            if p.name.lower().startswith('bot_'):
+                bot_name = p.name
+                break
+        if bot_name is None:
+            return
+
+        self.ponder_tasks[room_id] = asyncio.create_task(self._ponder_loop(room_id, game, current_round, bot_name))
+
+    async def _ponder_loop(self, room_id, game, current_round, bot_name):
+        # Si riprende l'albero dello stesso bot nello stesso round, altrimenti si riparte da zero
+        entry = self.ponder.get(room_id)
+        if entry is None or entry['bot'] != bot_name or entry['round'] is not current_round:
+            entry = {"bot": bot_name, "round": current_round, "tree": None, "ply": 0, "visits": 0,
+                     "rng": ponder_rng(current_round)}
+            self.ponder[room_id] = entry
+
+        turn = current_round.current_turn_index
+        ply = len(current_round.played_cards_history) + len(current_round.current_trick)
+        chunk = current_round.ai_config.get('ponder_iterations', 200)
+        limit = current_round.ai_config.get('ponder_limit', 5000)
+        loop = asyncio.get_running_loop()
+
+        while (self.ponder.get(room_id) is entry and entry['visits'] < limit
+               and self.active_games.get(room_id) is game and game.current_round is current_round
+               and current_round.state == RoundState.PLAYING
+               and current_round.current_turn_index == turn
+               and len(current_round.played_cards_history) + len(current_round.current_trick) == ply):
+            snapshot = pickle.dumps(current_round, protocol=pickle.HIGHEST_PROTOCOL)
+            try:
+                result = await loop.run_in_executor(self.get_ponder_executor(), ponder_task,
+                                                    snapshot, bot_name, entry['tree'], entry['ply'], chunk,
+                                                    entry['rng'].getrandbits(64))
+            except Exception as e:
+                print(f"[AI WARNING] Ricerca anticipata interrotta: {e}")
+                return
+            if self.ponder.get(room_id) is not entry:
+                return
+            entry['tree'], entry['ply'], entry['visits'] = result
+
+    async def take_ponder(self, room_id, current_round, bot_name):
+        """
+        Ritorna (albero, carte giocate) della ricerca anticipata di bot_name, o None.
+        Il blocco di ricerca in corso non si aspetta mai (potrebbe essere in coda dietro quelli di altre stanze):
+        il task viene annullato, con lui il blocco se è ancora in coda, e si usa l'ultimo albero già pronto.
+        """
+        task = self.ponder_tasks.pop(room_id, None)
+        if task is not None:
+            task.cancel()
+
+        entry = self.ponder.get(room_id)
+        if entry is None:
+            return None
+        if entry['round'] is not current_round:
+            self.ponder.pop(room_id, None)
+            return None
+        # L'albero di un altro bot resta buono per quando toccherà a lui
+        if entry['bot'] != bot_name or entry['tree'] is None:
+            return None
+        self.ponder.pop(room_id, None)
+        return entry['tree'], entry['ply']
+
+    def _build_state(self, room_id):
+        """
+        Stato della stanza diviso in una parte pubblica, uguale per tutti, e nei dati per le viste dei giocatori.
+        Ritorna un dict con:
+          public: lo stato senza "players" e "is_creator"
+          seats: (nome, info pubbliche, mano vista dal proprietario, mano vista dagli altri); mani None = niente chiave "hand"
+          creator: il creatore della stanza; with_is_creator: se lo stato contiene "is_creator"
+          game: la partita (None in lobby), serve per lo storico già serializzato
+        """
         # --- STATO LOBBY ---
         if room_id not in self.active_games:
             players = self.lobby_players.get(room_id, [])
@@ -34,23 +249,28 @@ class GameManager:
             max_players = config.get('max_players', 6)
 
             return {
-                "state": "LOBBY",
-                "room_id": room_id,
-                "players": [{"name": n, "score": 0, "tricks_won": 0, "prediction": None} for n in players],
-                "can_start": len(players) >= max_players and config.get('configured', False),
-                "table_cards": [],
-                "round_num": 0,
-                "current_turn": None,
-                "trump_card": None,
-                "trump_suit": None,
-                "cards_to_deal": 0,
-                "dealer": None,
-                "round_history": [],
-                "is_creator": player_id == creator,
+                "public": {
+                    "state": "LOBBY",
+                    "room_id": room_id,
+                    "can_start": len(players) >= max_players and config.get('configured', False),
+                    "table_cards": [],
+                    "round_num": 0,
+                    "current_turn": None,
+                    "trump_card": None,
+                    "trump_suit": None,
+                    "cards_to_deal": 0,
+                    "dealer": None,
+                    "round_history": [],
+                    "creator": creator,
+                    "config": config,
+                    "lobby_ready": config.get('configured', False),
+                    "chat": []  # Niente chat in lobby
+                },
+                "seats": [(n, {"name": n, "score": 0, "tricks_won": 0, "prediction": None}, None, None)
+                          for n in players],
                 "creator": creator,
-                "config": config,
-                "lobby_ready": config.get('configured', False),
-                "chat": []  # Niente chat in lobby
+                "with_is_creator": True,
+                "game": None,
             }
 
         # --- STATO PARTITA ---
@@ -60,25 +280,30 @@ class GameManager:
         if not hasattr(game, 'chat'):
             game.chat = []
 
-        if not game.rounds:
+        if game.current_round is None:
             return {
-                "state": "LOBBY",
-                "room_id": room_id,
-                "players": [{"name": p.name, "score": p.score, "tricks_won": 0, "prediction": None} for p in
-                            game.players],
-                "can_start": False,
-                "table_cards": [],
-                "round_num": 0,
-                "current_turn": None,
-                "trump_card": None,
-                "trump_suit": None,
-                "cards_to_deal": 0,
-                "dealer": None,
-                "round_history": game.get_history(),
-                "chat": game.chat
+                "public": {
+                    "state": "LOBBY",
+                    "room_id": room_id,
+                    "can_start": False,
+                    "table_cards": [],
+                    "round_num": 0,
+                    "current_turn": None,
+                    "trump_card": None,
+                    "trump_suit": None,
+                    "cards_to_deal": 0,
+                    "dealer": None,
+                    "round_history": game.get_history(),
+                    "chat": game.chat
+                },
+                "seats": [(p.name, {"name": p.name, "score": p.score, "tricks_won": 0, "prediction": None}, None, None)
+                          for p in game.players],
+                "creator": game.creator,
+                "with_is_creator": False,
+                "game": game,
             }
 
-        curr = game.rounds[-1]
+        curr = game.current_round
 
         current_turn_name = None
         if curr.state == RoundState.BIDDING:
@@ -96,7 +321,7 @@ class GameManager:
         is_last_round = (game.round_number == last_round_num)
         game_finished = is_last_round and curr.state == RoundState.FINISHED
 
-        state = {
+        public = {
             "state": curr.state.name,
             "room_id": room_id,
             "round_num": game.round_number,
@@ -108,11 +333,9 @@ class GameManager:
                             zip(curr.current_trick, curr.trick_order)] if hasattr(curr, 'current_trick') else [],
             "last_trick_cards": [c.to_dict() for c in curr.last_trick] if hasattr(curr, 'last_trick') else [],
             "tricks_completed": curr.tricks_completed if hasattr(curr, 'tricks_completed') else 0,
-            "players": [],
             "cards_to_deal": curr.cards_per_player,
             "dealer": game.players[curr.dealer_index].name,
             "round_history": game.get_history(),
-            "is_creator": game.is_creator(player_id),
             "creator": game.creator,
             "config": game.config,
             "selected_rounds": game.selected_rounds,
@@ -125,62 +348,215 @@ class GameManager:
         }
 
         is_first_round_of_game = (game.current_round_index == 0)
-
+        # --- LOGICA VISIBILITÀ CARTE ---
+        # Caso speciale: 1° round con carte scoperte DURANTE le scommesse
+        is_special_first_round_bidding = (
+                game.first_round_open_cards and
+                is_first_round_of_game and
+                (curr.state == RoundState.BIDDING or curr.state == RoundState.WAITING_FOR_DEALER_TRUMP)
+        )
+
+        seats = []
         for p in game.players:
             p_info = {
                 "name": p.name,
                 "score": p.score,
                 "tricks_won": curr.tricks_won.get(p.name, 0) if hasattr(curr, 'tricks_won') else 0,
                 "prediction": curr.bids.get(p.name, None) if hasattr(curr, 'bids') else None,
-                "hand": []
             }
+            face_up = [c.to_dict() for c in p.hand] if hasattr(p, 'hand') and p.hand else []
 
-            # --- LOGICA VISIBILITÀ CARTE ---
-            # Caso speciale: 1° round con carte scoperte DURANTE le scommesse
-            is_special_first_round_bidding = (
-                    game.first_round_open_cards and
-                    is_first_round_of_game and
-                    (curr.state == RoundState.BIDDING or curr.state == RoundState.WAITING_FOR_DEALER_TRUMP)
-            )
-
-            if p.name == player_id:
-                # Se sono io
-                if is_special_first_round_bidding:
-                    # DEVO COPRIRE LE MIE CARTE (mostro il dorso)
-                    p_info['hand'] = [{"type": "BACK", "suit": None, "value": None, "id": None} for _ in p.hand]
-                else:
-                    # Normalmente vedo le mie carte
-                    p_info['hand'] = [c.to_dict() for c in p.hand] if hasattr(p, 'hand') and p.hand else []
+            if is_special_first_round_bidding:
+                # Io vedo il dorso delle mie carte, gli altri le vedono scoperte
+                own_hand = [{"type": "BACK", "suit": None, "value": None, "id": None} for _ in p.hand]
+                others_hand = face_up
             else:
-                # Se sono gli altri
-                if is_special_first_round_bidding:
-                    # VEDO le carte degli altri
-                    p_info['hand'] = [c.to_dict() for c in p.hand] if hasattr(p, 'hand') and p.hand else []
-                else:
-                    # Normalmente non vedo le carte degli altri
-                    p_info['hand'] = []
+                # Normalmente vedo solo le mie carte
+                own_hand = face_up
+                others_hand = []
+
+            seats.append((p.name, p_info, own_hand, others_hand))
+
+        return {"public": public, "seats": seats, "creator": game.creator, "with_is_creator": True, "game": game}
+
+    @staticmethod
+    def _viewer_part(view, player_id):
+        """Parte dello stato che cambia da giocatore a giocatore: le mani visibili e is_creator"""
+        part = {
+            "players": [
+                {**info, "hand": own_hand if name == player_id else others_hand} if own_hand is not None else info
+                for name, info, own_hand, others_hand in view['seats']
+            ]
+        }
+        if view['with_is_creator']:
+            part["is_creator"] = player_id == view['creator']
+        return part
+
+    @staticmethod
+    def _encode_fragments(view, player_id):
+        """
+        Stato per un giocatore come {chiave di primo livello: valore già in JSON}.
+        view['fragments'] contiene la parte pubblica, serializzata una volta per broadcast;
+        lo storico arriva già serializzato dalla cache di Game e viene usato così com'è.
+        """
+        if 'fragments' not in view:
+            public = view['public']
+            game = view['game']
+            fragments = {k: dumps_json(v) for k, v in public.items() if not (k == 'round_history' and game)}
+            if game is not None:
+                fragments['round_history'] = game.get_history_json()
+            view['fragments'] = fragments
+        viewer = {k: dumps_json(v) for k, v in GameManager._viewer_part(view, player_id).items()}
+        return {**view['fragments'], **viewer}
+
+    @staticmethod
+    def _join_fragments(fragments):
+        return '{' + ','.join(f'"{k}":{v}' for k, v in fragments.items()) + '}'
 
-            state["players"].append(p_info)
-        return state
+    def get_game_state(self, room_id, player_id):
+        view = self._build_state(room_id)
+        return {**view['public'], **self._viewer_part(view, player_id)}
+
+    async def send_state(self, ws, fragments):
+        """
+        Protocollo di sincronizzazione: la prima volta (o dopo un "resync") la connessione riceve
+        {"type": "snapshot", "version", "state"}, poi solo le chiavi di primo livello cambiate:
+        {"type": "patch", "version", "base", "set", "unset"}. "base" è la versione a cui il client
+        deve essere per applicare la patch; se non coincide il client chiede un resync.
+        Le versioni sono per connessione e crescono di uno a ogni messaggio; se non cambia nulla non si invia niente.
+        """
+        sent = ws.sync_sent
+        if sent is None:
+            message = (f'{{"type":"snapshot","version":{ws.sync_version + 1},'
+                       f'"state":{self._join_fragments(fragments)}}}')
+        else:
+            changed = {k: v for k, v in fragments.items() if sent.get(k) != v}
+            removed = [k for k in sent if k not in fragments]
+            if not changed and not removed:
+                return
+            message = (f'{{"type":"patch","version":{ws.sync_version + 1},"base":{ws.sync_version},'
+                       f'"set":{self._join_fragments(changed)},"unset":{json.dumps(removed)}}}')
+        ws.sync_version += 1
+        ws.sync_sent = fragments
+        await ws.send_text(message)
 
     async def broadcast(self, room_id):
         if room_id not in self.rooms: return
-        for ws in self.rooms[room_id][:]:
-            try:
-                state = self.get_game_state(room_id, ws.player_id)
-                await ws.send_text(json.dumps(state))
-            except Exception:
-                if ws in self.rooms[room_id]:
-                    self.rooms[room_id].remove(ws)
+        # Parte pubblica costruita e serializzata una volta sola; per ogni socket si aggiunge solo la sua vista
+        try:
+            view = self._build_state(room_id)
+        except Exception as e:
+            print(f"[ERROR] Stato della stanza {room_id} non disponibile: {e}")
+            return
+        # Si mette solo in coda: ogni connessione ha il suo task di invio, un client lento non ferma gli altri
+        for ws in self.rooms[room_id]:
+            self.queue_state(ws, self._encode_fragments(view, ws.player_id))
+
+    # --- CODE DI INVIO ---
+    def open_connection(self, ws, room_id):
+        """Prepara la coda di uscita della connessione e avvia il task che la svuota"""
+        ws.room_id = room_id
+        # Stato di sincronizzazione: versione e frammenti dell'ultimo stato inviato (None = serve uno snapshot)
+        ws.sync_version = 0
+        ws.sync_sent = None
+        # Ultimo stato da inviare: se il client è indietro quelli intermedi vengono sostituiti
+        ws.pending_state = None
+        ws.coalesced = 0
+        # Altri messaggi (errori, avvisi), inviati tutti e in ordine
+        ws.outbox = deque()
+        ws.send_wakeup = asyncio.Event()
+        ws.send_closing = False
+        # Coda piena: il task di invio chiude la connessione alla prima occasione
+        ws.send_overflow = False
+        ws.send_task = asyncio.create_task(self._sender_loop(ws))
+
+    def queue_state(self, ws, fragments):
+        if ws.pending_state is not None:
+            ws.coalesced += 1
+        ws.pending_state = fragments
+        ws.send_wakeup.set()
+
+    def queue_message(self, ws, text):
+        if len(ws.outbox) >= SEND_QUEUE_LIMIT:
+            ws.send_overflow = True
+            ws.send_wakeup.set()
+            return
+        ws.outbox.append(text)
+        ws.send_wakeup.set()
+
+    def _detach(self, ws):
+        room = self.rooms.get(ws.room_id)
+        if room is not None and ws in room:
+            room.remove(ws)
+
+    async def _drop_slow(self, ws):
+        """Chiamato solo dal task di invio della connessione"""
+        if ws.send_closing:
+            return
+        ws.send_closing = True
+        print(f"[WS] {ws.player_id} troppo lento, disconnesso (stati saltati: {ws.coalesced})")
+        self._detach(ws)
+        try:
+            await ws.close(code=1013, reason="Connessione troppo lenta")
+        except Exception:
+            pass
+
+    async def _sender_loop(self, ws):
+        try:
+            while True:
+                await ws.send_wakeup.wait()
+                ws.send_wakeup.clear()
+                while ws.outbox or ws.pending_state is not None or ws.send_overflow:
+                    if ws.send_overflow:
+                        await self._drop_slow(ws)
+                        return
+                    if ws.outbox:
+                        await asyncio.wait_for(ws.send_text(ws.outbox.popleft()), SEND_TIMEOUT)
+                    else:
+                        fragments, ws.pending_state = ws.pending_state, None
+                        await asyncio.wait_for(self.send_state(ws, fragments), SEND_TIMEOUT)
+                if ws.send_closing:
+                    return
+        except asyncio.TimeoutError:
+            await self._drop_slow(ws)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Connessione già chiusa
+            self._detach(ws)
+
+    async def close_connection(self, ws):
+        """Alla chiusura del websocket: invia quello che resta in coda (es. lobby_destroyed) e ferma il task"""
+        if ws.send_task.done():
+            return
+        ws.send_closing = True
+        ws.send_wakeup.set()
+        # asyncio.wait non solleva eccezioni: se il client non riceve entro il limite si annulla e basta
+        await asyncio.wait({ws.send_task}, timeout=SEND_TIMEOUT)
+        ws.send_task.cancel()
 
 
 manager = GameManager()
 
 
+@app.on_event("shutdown")
+async def shutdown_bot_executor():
+    if manager._bot_executor is not None:
+        manager._bot_executor.shutdown(wait=False, cancel_futures=True)
+    if manager._ponder_executor is not None:
+        manager._ponder_executor.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/")
 async def get_index(): return FileResponse('index.html')
 
 
+@app.get("/ai/decisions")
+async def get_ai_decisions(limit: int = Query(200, ge=1, le=ai_stats.MAX_RECORDS)):
+    # Ultime decisioni dei bot (tempo, rollout, margine) e medie per tipo e dimensione del tavolo
+    return {"summary": ai_stats.summary(), "decisions": ai_stats.last(limit)}
+
+
 @app.get("/favicon.ico")
 async def get_favicon(): return JSONResponse(content={}, status_code=204)
 
@@ -218,7 +594,7 @@ async def gestisci_turno_bot(manager, room_id):
         return
 
     # Recuperiamo il round corrente e il giocatore di turno
-    current_round = game.rounds[-1]
+    current_round = game.current_round
 
     # Giocatore mazziere
     idx = current_round.dealer_index
@@ -244,19 +620,51 @@ async def gestisci_turno_bot(manager, room_id):
     idx = current_round.current_turn_index
     player = game.players[idx]
 
-    # SE NON È UN BOT, ci fermiamo subito. Tocca a un umano.
+    # SE NON È UN BOT, ci fermiamo subito. Tocca a un umano: intanto i bot possono pensare.
     if not player.name.lower().startswith('bot_'):
+        manager.start_pondering(room_id, game, current_round)
+        return
+
+    if current_round.state not in (RoundState.BIDDING, RoundState.PLAYING):
+        return
+
+    # Un bot sta già pensando in questa stanza: sarà lui a proseguire
+    if room_id in manager.bot_futures:
         return
 
     # --- È IL TURNO DI UN BOT! ---
     print(f"[AI] Tocca al bot {player.name}...")
+    state_before = current_round.state
+    manager.bot_futures[room_id] = None
 
-    # Simula un tempo di "pensiero"
-    await asyncio.sleep(1.5)
+    try:
+        # Simula un tempo di "pensiero"
+        await asyncio.sleep(1.5)
+
+        if manager.active_games.get(room_id) is not game:
+            return
+
+        # Il calcolo gira nel pool di processi: le altre stanze continuano a giocare
+        kind = 'bid' if state_before == RoundState.BIDDING else 'card'
+        ponder = await manager.take_ponder(room_id, current_round, player.name) if kind == 'card' else None
+        decision = await manager.run_bot_decision(room_id, kind, current_round, player, ponder)
+    except Exception as e:
+        print(f"ERRORE GRAVE BOT: {e}")
+        return
+    finally:
+        manager.bot_futures.pop(room_id, None)
+
+    # Nel frattempo la stanza può essere stata chiusa o la partita resettata
+    if decision is None or manager.active_games.get(room_id) is not game:
+        return
+    if game.current_round is not current_round or current_round.state != state_before or current_round.current_turn_index != idx:
+        print(f"[AI] Decisione di {player.name} scartata: lo stato è cambiato")
+        # Rivaluta il turno sullo stato nuovo
+        await gestisci_turno_bot(manager, room_id)
+        return
 
     if current_round.state == RoundState.BIDDING:
-        # Calcola il numero
-        prediction_val = current_round.get_bot_prediction(player)
+        prediction_val = decision
         try:
             current_round.make_bid(player.name, prediction_val)
         except Exception as e:
@@ -271,8 +679,7 @@ async def gestisci_turno_bot(manager, room_id):
 
     elif current_round.state == RoundState.PLAYING:
         # --- FASE DI GIOCO CARTE
-        # Calcola il numero
-        card_played = current_round.get_bot_card_to_play(player)
+        card_played = decision
         try:
             current_round.play_card(player.name, card_played)
             if current_round.state == RoundState.FINISHED:
@@ -307,6 +714,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
 
     await websocket.accept()
     websocket.player_id = player_id
+    manager.open_connection(websocket, room_id)
     manager.rooms[room_id].append(websocket)
     if player_id not in manager.lobby_players[room_id]:
         manager.lobby_players[room_id].append(player_id)
@@ -322,6 +730,10 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
             if msg.get('action') == 'ping':
                 continue
 
+            if msg.get('action') == 'resync':
+                # Il client ha perso una patch: al broadcast qui sotto riceverà uno snapshot completo
+                websocket.sync_sent = None
+
             game = manager.active_games.get(room_id)
 
             if msg['action'] == 'configure_lobby':
@@ -335,6 +747,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                         'max_players': int(msg['max_players']),
                         'selected_rounds': selected_rounds,
                         'first_round_open_cards': first_round_open_cards,
+                        'ai': lobby_ai_config(msg),
                         'configured': True
                     }
                     manager.lobby_configs[room_id] = config
@@ -386,12 +799,14 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
 
                 if current_players_count > max_players:
                     # Invia un errore al client che ha provato ad avviare
-                    await websocket.send_text(json.dumps({
+                    manager.queue_message(websocket, json.dumps({
                         "error": f"Troppi giocatori! Il limite è impostato a {max_players}, ma siete in {current_players_count}. Rimuovi qualcuno per iniziare.",
                         "action": "error_notify"
                     }))
                     continue  # Blocca l'esecuzione, non avvia il gioco
                 if room_id not in manager.active_games:
+                    # Anche una stanza mai configurata gioca con il limite di tempo dei bot
+                    config.setdefault('ai', dict(DEFAULT_AI_CONFIG))
                     new_game = Game(manager.lobby_players[room_id], config)
                     # Inizializza esplicitamente la chat
                     new_game.chat = []
@@ -403,34 +818,34 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
                     await gestisci_turno_bot(manager, room_id)
 
             elif msg['action'] == 'start_next_round' and game:
-                if game.is_creator(player_id) and game.rounds[-1].state == RoundState.FINISHED:
+                if game.is_creator(player_id) and game.current_round.state == RoundState.FINISHED:
                     game.start_next_round()
                     # Controllo se BOT
                     await gestisci_turno_bot(manager, room_id)
 
             elif msg['action'] == 'select_trump' and game:
-                game.rounds[-1].set_trump_suit(Suit[msg['suit']])
+                game.current_round.set_trump_suit(Suit[msg['suit']])
                 # Controllo se BOT
                 await gestisci_turno_bot(manager, room_id)
 
             elif msg['action'] == 'play_card' and game:
                 try:
                     card_to_play = msg['card']
-                    game.rounds[-1].play_card(player_id, card_to_play)
-                    if game.rounds[-1].state == RoundState.FINISHED:
-                        game.rounds[-1].calculate_scores()
+                    game.current_round.play_card(player_id, card_to_play)
+                    if game.current_round.state == RoundState.FINISHED:
+                        game.current_round.calculate_scores()
 
                     # Controllo se BOT
                     await gestisci_turno_bot(manager, room_id)
 
                 except Exception as e:
-                    await websocket.send_text(json.dumps({"error": str(e), "action": "error_notify"}))
+                    manager.queue_message(websocket, json.dumps({"error": str(e), "action": "error_notify"}))
 
             elif msg['action'] == 'make_bid' and game:
                 try:
-                    game.rounds[-1].make_bid(player_id, int(msg['bid']))
+                    game.current_round.make_bid(player_id, int(msg['bid']))
                 except Exception as e:
-                    await websocket.send_text(json.dumps({"error": str(e), "action": "error_notify"}))
+                    manager.queue_message(websocket, json.dumps({"error": str(e), "action": "error_notify"}))
                 await gestisci_turno_bot(manager, room_id)
 
             elif msg['action'] == 'new_game' and game:
@@ -446,13 +861,11 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
 
                     # 1. Avvisa tutti i client
                     for ws_client in manager.rooms[room_id]:
-                        try:
-                            # Inviamo un messaggio speciale che il frontend riconoscerà
-                            await ws_client.send_text(json.dumps({"action": "lobby_destroyed"}))
-                        except:
-                            pass
+                        # Inviamo un messaggio speciale che il frontend riconoscerà
+                        manager.queue_message(ws_client, json.dumps({"action": "lobby_destroyed"}))
 
-                    # 2. Pulisci la memoria del server
+                    # 2. Pulisci la memoria del server (e annulla l'eventuale calcolo di un bot)
+                    manager.cancel_bot_decision(room_id)
                     if room_id in manager.rooms: del manager.rooms[room_id]
                     if room_id in manager.lobby_players: del manager.lobby_players[room_id]
                     if room_id in manager.active_games: del manager.active_games[room_id]
@@ -490,6 +903,8 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, player_id: str)
         await manager.broadcast(room_id)
     except Exception as e:
         print(f"[ERROR] WS Disconnessione imprevista: {e}")
+    finally:
+        await manager.close_connection(websocket)
 
 
 if __name__ == "__main__":
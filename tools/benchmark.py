@@ -0,0 +1,280 @@
+# tools/benchmark.py
+"""
+Micro-benchmark dei punti caldi di engine e AI, con baseline JSON.
+
+Ogni benchmark gira su scenari fissi e con seme (3..6 giocatori, 1..10 carte) e misura
+il tempo medio per chiamata in microsecondi (il migliore di --repeat ripetizioni).
+
+Uso:
+    python -m tools.benchmark run --out baseline.json
+    python -m tools.benchmark compare baseline.json              # misura ora e confronta
+    python -m tools.benchmark compare baseline.json --against new.json
+`compare` termina con codice 1 se qualche misura è più lenta della baseline oltre --threshold.
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import platform
+import random
+import sys
+import time
+from engine.card import Suit
+from engine.deck import create_deck
+from engine.enums import RoundState
+from engine.game import Game
+from engine.player import Player
+from engine.round import Round
+from engine.trick import winning_card, winning_card_fast
+from ai_engine import MonteCarloBot
+
+# (giocatori, carte a testa)
+SCENARIOS = [(3, 1), (4, 5), (5, 8), (6, 10)]
+SEED = 1234
+
+
+def _scenario_name(num_players, cards):
+    return f"{num_players}p-{cards}c"
+
+
+def make_round(num_players, cards, seed=SEED, played=None):
+    """
+    Round con scommesse fatte e `played` carte già giocate (di default metà della prima mano),
+    così le mosse valide dipendono dal seme di uscita.
+    """
+    players = [Player(f"bot_{i}") for i in range(num_players)]
+    r = Round(players, cards, 0, rng=random.Random(seed))
+    r.setup()
+    if r.state == RoundState.WAITING_FOR_DEALER_TRUMP:
+        r.set_trump_suit(Suit.CUORI)
+    while r.state == RoundState.BIDDING:
+        p = r.players[r.current_turn_index]
+        bid = 0 if r.current_turn_index != r.dealer_index or sum(r.bids.values()) != cards else 1
+        r.make_bid(p.name, bid)
+
+    if played is None:
+        played = num_players // 2
+    for _ in range(played):
+        p = r.players[r.current_turn_index]
+        r.play_card(p.name, r.get_valid_moves(p)[0])
+    return r
+
+
+def _measure(fn, calls, repeat):
+    """Tempo medio per chiamata (µs), il migliore su `repeat` ripetizioni"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best * 1e6
+
+
+def _measure_each(make_args, fn, calls, repeat):
+    """Come _measure, ma con argomenti nuovi a ogni chiamata preparati fuori dal tempo misurato"""
+    best = float('inf')
+    for _ in range(repeat):
+        args = [make_args() for _ in range(calls)]
+        start = time.perf_counter()
+        for a in args:
+            fn(*a)
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best * 1e6
+
+
+def bench_create_deck(num_players, cards, repeat):
+    rng = random.Random(SEED)
+    return _measure(lambda: create_deck(rng), 2000, repeat)
+
+
+def bench_sort_hand(num_players, cards, repeat):
+    r = make_round(num_players, cards, played=0)
+    player = r.players[0]
+    return _measure(player.sort_hand, 5000, repeat)
+
+
+def bench_get_valid_moves(num_players, cards, repeat):
+    r = make_round(num_players, cards)
+    player = r.players[r.current_turn_index]
+    return _measure(lambda: r.get_valid_moves(player), 5000, repeat)
+
+
+def bench_play_card(num_players, cards, repeat):
+    r = make_round(num_players, cards)
+
+    def make_args():
+        rc = copy.deepcopy(r)
+        p = rc.players[rc.current_turn_index]
+        return rc, p.name, rc.get_valid_moves(p)[0]
+
+    return _measure_each(make_args, lambda rc, name, card: rc.play_card(name, card), 500, repeat)
+
+
+def bench_winning_card(num_players, cards, repeat):
+    deck = create_deck(random.Random(SEED))
+    trick = deck[:num_players]
+    return _measure(lambda: winning_card(trick, Suit.PICCHE), 20000, repeat)
+
+
+def bench_winning_card_fast(num_players, cards, repeat):
+    # Prima di misurare: stesso vincitore di winning_card su molte mani casuali, con e senza briscola
+    rng = random.Random(SEED)
+    for _ in range(2000):
+        deck = create_deck(rng)
+        sample = deck[:num_players]
+        trump = rng.choice([None, *Suit])
+        assert winning_card_fast(sample, trump) == winning_card(sample, trump), (sample, trump)
+
+    deck = create_deck(random.Random(SEED))
+    trick = deck[:num_players]
+    return _measure(lambda: winning_card_fast(trick, Suit.PICCHE), 20000, repeat)
+
+
+def bench_determinize_round(num_players, cards, repeat):
+    r = make_round(num_players, cards)
+    bot = MonteCarloBot(r.players[r.current_turn_index].name, r, rng=random.Random(SEED))
+    bot._prepare_simulation()
+    return _measure(bot._determinize_round, 2000, repeat)
+
+
+def bench_play_randomout(num_players, cards, repeat):
+    r = make_round(num_players, cards)
+    bot = MonteCarloBot(r.players[r.current_turn_index].name, r, rng=random.Random(SEED))
+    return _measure_each(lambda: (bot._determinize_round(),), bot._play_randomout, 1000, repeat)
+
+
+def bench_choose_best_card(num_players, cards, repeat):
+    r = make_round(num_players, cards)
+    name = r.players[r.current_turn_index].name
+
+    def choose():
+        bot = MonteCarloBot(name, r, rng=random.Random(SEED), endgame_cards=0)
+        bot.choose_best_card(simulations=50)
+
+    return _measure(choose, 5, repeat)
+
+
+def bench_broadcast_state(num_players, cards, repeat):
+    """Percorso di GameManager.broadcast: stato costruito una volta e frammenti JSON per ogni giocatore"""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from server import GameManager
+    except ImportError:
+        return None  # Serve fastapi
+
+    r = make_round(num_players, cards)
+    with contextlib.redirect_stdout(io.StringIO()):
+        game = Game([p.name for p in r.players], {'selected_rounds': [cards]})
+    game.players = r.players
+    game.current_round = r
+    manager = GameManager()
+    manager.active_games['BENCH'] = game
+    viewers = [p.name for p in r.players]
+
+    def broadcast_state():
+        view = manager._build_state('BENCH')
+        for viewer in viewers:
+            manager._encode_fragments(view, viewer)
+
+    return _measure(broadcast_state, 2000, repeat)
+
+
+BENCHMARKS = {
+    'create_deck': bench_create_deck,
+    'sort_hand': bench_sort_hand,
+    'get_valid_moves': bench_get_valid_moves,
+    'play_card': bench_play_card,
+    'winning_card': bench_winning_card,
+    'winning_card_fast': bench_winning_card_fast,
+    'determinize_round': bench_determinize_round,
+    'play_randomout': bench_play_randomout,
+    'choose_best_card': bench_choose_best_card,
+    'broadcast_state': bench_broadcast_state,
+}
+
+
+def run(selected, repeat):
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        for num_players, cards in SCENARIOS:
+            key = f"{name}[{_scenario_name(num_players, cards)}]"
+            us = bench(num_players, cards, repeat)
+            if us is None:
+                print(f"{key:40s} saltato (dipendenze mancanti)")
+                break
+            results[key] = round(us, 3)
+            print(f"{key:40s} {us:12.2f} µs")
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Stampa il confronto e ritorna il numero di regressioni"""
+    regressions = 0
+    for key, base_us in baseline['results'].items():
+        now_us = current['results'].get(key)
+        if now_us is None:
+            print(f"{key:40s} {'mancante':>12s}")
+            continue
+        ratio = now_us / base_us if base_us else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSIONE'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = '  migliorato'
+        print(f"{key:40s} {base_us:12.2f} -> {now_us:12.2f} µs  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark di engine e AI")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help="esegue i benchmark")
+    p_run.add_argument('--out', default=None, help="file JSON in cui salvare i risultati")
+    p_run.add_argument('--only', nargs='*', default=None, help="solo i benchmark che contengono questi nomi")
+    p_run.add_argument('--repeat', type=int, default=5)
+
+    p_cmp = sub.add_parser('compare', help="confronta con una baseline")
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('--against', default=None, help="risultati già salvati; altrimenti misura ora")
+    p_cmp.add_argument('--only', nargs='*', default=None)
+    p_cmp.add_argument('--repeat', type=int, default=5)
+    p_cmp.add_argument('--threshold', type=float, default=0.10, help="rallentamento tollerato (0.10 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        current = run(args.only, args.repeat)
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(current, f, indent=2)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.only:
+        baseline['results'] = {k: v for k, v in baseline['results'].items() if any(s in k for s in args.only)}
+    if args.against:
+        with open(args.against) as f:
+            current = json.load(f)
+    else:
+        current = run(args.only, args.repeat)
+        print()
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"\n{regressions} regressioni oltre il {100 * args.threshold:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
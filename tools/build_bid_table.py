@@ -0,0 +1,83 @@
+# tools/build_bid_table.py
+"""
+Costruisce data/bid_table.json giocando round in self-play.
+
+Per ogni numero di giocatori (3..6) e di carte a testa si distribuiscono `--deals` round
+con engine.round.Round; ogni round viene giocato `--rollouts` volte a mani scoperte con
+mosse casuali ma valide (le stesse dei rollout del bot) e le prese di ogni giocatore
+vengono accumulate nella sua classe di mano (vedi ai_bid_table.table_key).
+Solo le classi con almeno `--min-count` osservazioni finiscono nella tabella.
+
+Uso: python -m tools.build_bid_table [--deals 5000] [--rollouts 4] [--seed 0]
+"""
+import argparse
+import json
+import random
+import time
+from engine.card import NUM_CARDS, SUITS, card_to_int, suit_to_int
+from engine.enums import RoundState
+from engine.player import Player
+from engine.round import Round
+from ai_bid_table import TABLE_PATH, table_key
+from ai_sim import SimState, mask_of
+
+
+def play_deals(num_players, cards_per_player, deals, rollouts, rng, totals):
+    players = [Player(f"bot_{i}") for i in range(num_players)]
+    for d in range(deals):
+        dealer = d % num_players
+        r = Round(players, cards_per_player, dealer, rng=rng)
+        r.setup()
+        if r.state == RoundState.WAITING_FOR_DEALER_TRUMP:
+            r.set_trump_suit(rng.choice(SUITS))
+        trump = suit_to_int(r.trump_suit)
+
+        keys = []
+        for seat, p in enumerate(players):
+            cards = [card_to_int(c) for c in p.hand]
+            keys.append(table_key(cards, trump, num_players, (seat - dealer) % num_players))
+
+        base = SimState.from_round(r, 0)
+        for seat, p in enumerate(players):
+            base.hands[seat] = mask_of(p.hand)
+
+        for _ in range(rollouts):
+            tricks = base.copy().rollout(rng)
+            for key, won in zip(keys, tricks):
+                entry = totals.setdefault(key, [0, 0])
+                entry[0] += 1
+                entry[1] += won
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costruisce la tabella delle scommesse in self-play")
+    parser.add_argument('--deals', type=int, default=5000, help="round distribuiti per ogni configurazione")
+    parser.add_argument('--rollouts', type=int, default=4, help="partite giocate per ogni distribuzione")
+    parser.add_argument('--min-count', type=int, default=30, help="osservazioni minime per tenere una classe")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=TABLE_PATH)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    totals = {}
+    start = time.perf_counter()
+
+    for num_players in range(3, 7):
+        for cards_per_player in range(1, NUM_CARDS // num_players + 1):
+            play_deals(num_players, cards_per_player, args.deals, args.rollouts, rng, totals)
+        print(f"{num_players} giocatori: {len(totals)} classi, {time.perf_counter() - start:.1f}s")
+
+    table = {key: round(won / n, 3) for key, (n, won) in totals.items() if n >= args.min_count}
+    with open(args.out, 'w') as f:
+        json.dump({
+            "key": "giocatori,carte,posto,briscola,wizard,jester,briscole,briscole_alte,alte_altri_semi",
+            "deals": args.deals,
+            "rollouts": args.rollouts,
+            "seed": args.seed,
+            "table": table,
+        }, f, separators=(',', ':'))
+    print(f"Scritte {len(table)} classi su {len(totals)} in {args.out}")
+
+
+if __name__ == '__main__':
+    main()
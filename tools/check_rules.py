@@ -0,0 +1,230 @@
+# tools/check_rules.py
+"""
+Controlli ripetibili delle regole ottimizzate.
+
+Ogni controllo confronta una versione veloce del motore con un'implementazione di riferimento
+semplice (le regole come erano scritte prima delle ottimizzazioni), su casi casuali con seme.
+Va lanciato dopo ogni modifica a trick, round o campionamento delle mani.
+
+Uso: python -m tools.check_rules [--cases 3000] [--seed 0] [--only beats ...]
+Termina con codice 1 alla prima differenza.
+"""
+import argparse
+import random
+import sys
+import time
+from ai_sim import DealSampler, bits
+from engine.card import FIRST_WIZARD, NO_SUIT, CardType, Suit, suit_to_int
+from engine.deck import create_deck
+from engine.enums import RoundState
+from engine.player import Player
+from engine.round import Round
+from engine.trick import beats, winning_card, winning_card_fast, winning_index
+
+TRUMPS = [None, *Suit]
+
+
+class RuleMismatch(Exception):
+    pass
+
+
+def check_beats(cases, rng):
+    """Tabella BEATS (winning_index, winning_card_fast, beats passo per passo) contro winning_card"""
+    for _ in range(cases):
+        deck = create_deck(rng)
+        trick = deck[:rng.randint(1, 6)]
+        trump = rng.choice(TRUMPS)
+        expected = winning_card(trick, trump)
+
+        codes = [c.code for c in trick]
+        trump_int = suit_to_int(trump)
+        found = {
+            "winning_index": winning_index(codes, trump_int),
+            "winning_card_fast": winning_card_fast(trick, trump),
+        }
+
+        # Come lo usa Round: la migliore si aggiorna carta per carta, col seme di uscita noto finora
+        best = 0
+        for i in range(1, len(codes)):
+            if beats(codes[i], codes[best], _lead_of(codes[:i + 1]), trump_int):
+                best = i
+        found["beats"] = best
+
+        for name, index in found.items():
+            if index != expected:
+                raise RuleMismatch(f"{name}: {[str(c) for c in trick]} briscola {trump}: {index} invece di {expected}")
+
+
+def _lead_of(codes):
+    """Seme di uscita come lo vuole beats: quello della prima carta numerica, NO_SUIT se non c'è"""
+    for c in codes:
+        if c < FIRST_WIZARD:
+            return c // 13
+    return NO_SUIT
+
+
+def check_deal_sampler(cases, rng):
+    """DealSampler su distribuzioni vere: mani complete, carte ignote, nessuna carta di un seme mancante"""
+    for _ in range(cases):
+        num_players = rng.randint(3, 6)
+        hand_size = rng.randint(1, 60 // num_players)
+        codes = [c.code for c in create_deck(rng)]
+        hands = [codes[i * hand_size:(i + 1) * hand_size] for i in range(num_players)]
+
+        # Il giocatore 0 osserva: ignote sono tutte le carte tranne le sue.
+        # Un seme mancante è coerente solo se il giocatore davvero non ne ha
+        unknown = codes[hand_size:]
+        needs = {seat: hand_size for seat in range(1, num_players)}
+        voids = {}
+        for seat in needs:
+            absent = [s for s in range(4) if all(c >= FIRST_WIZARD or c // 13 != s for c in hands[seat])]
+            voids[seat] = set(rng.sample(absent, rng.randint(0, len(absent))))
+
+        sampler = DealSampler(unknown, needs, voids)
+        for _ in range(5):
+            sampled = sampler.sample(rng)
+            seen = set()
+            for seat, mask in sampled.items():
+                cards = bits(mask)
+                if len(cards) != needs[seat]:
+                    raise RuleMismatch(f"seat {seat}: {len(cards)} carte invece di {needs[seat]} (voids {voids})")
+                if seen & set(cards):
+                    raise RuleMismatch(f"seat {seat}: carte già date a un altro giocatore {sorted(seen & set(cards))}")
+                seen.update(cards)
+                bad = [c for c in cards if c < FIRST_WIZARD and c // 13 in voids[seat]]
+                if bad:
+                    raise RuleMismatch(f"seat {seat}: carte {bad} di semi mancanti {voids[seat]}")
+            if not seen <= set(unknown):
+                raise RuleMismatch(f"carte non ignote distribuite: {sorted(seen - set(unknown))}")
+        if sampler.stats["infeasible"]:
+            raise RuleMismatch(f"vincoli coerenti giudicati impossibili: needs {needs} voids {voids}")
+
+
+def _new_round(rng):
+    """Round casuale (3..6 giocatori) con briscola scelta e scommesse fatte, pronto per giocare"""
+    num_players = rng.randint(3, 6)
+    cards = rng.randint(1, 60 // num_players)
+    players = [Player(f"bot_{i}") for i in range(num_players)]
+    r = Round(players, cards, rng.randrange(num_players), rng=random.Random(rng.getrandbits(64)))
+    r.setup()
+    if r.state == RoundState.WAITING_FOR_DEALER_TRUMP:
+        r.set_trump_suit(rng.choice(list(Suit)))
+    while r.state == RoundState.BIDDING:
+        p = r.players[r.current_turn_index]
+        bid = 0 if r.current_turn_index != r.dealer_index or sum(r.bids.values()) != cards else 1
+        r.make_bid(p.name, bid)
+    return r
+
+
+def _ref_lead_suit(trick):
+    """Seme di uscita come lo calcolava il vecchio Round: prima carta numerica, None se prima c'è un Wizard"""
+    for c in trick:
+        if c.type == CardType.WIZARD:
+            return None
+        if c.type == CardType.NUMBER:
+            return c.suit
+    return None
+
+
+def _ref_valid_moves(trick, hand):
+    """Vecchio Round.get_valid_moves, ricalcolato da zero sul trick"""
+    lead_suit = _ref_lead_suit(trick)
+    if lead_suit is None:
+        return list(hand)
+    if any(c.suit == lead_suit and c.type == CardType.NUMBER for c in hand):
+        return [c for c in hand if
+                (c.type == CardType.NUMBER and c.suit == lead_suit) or
+                c.type in [CardType.WIZARD, CardType.JESTER]]
+    return list(hand)
+
+
+def check_valid_moves(cases, rng):
+    """get_valid_moves e _validate_move incrementali contro le vecchie regole, su round giocati fino in fondo"""
+    for _ in range(cases):
+        r = _new_round(rng)
+        while r.state == RoundState.PLAYING:
+            player = r.players[r.current_turn_index]
+            expected = _ref_valid_moves(r.current_trick, player.hand)
+            found = r.get_valid_moves(player)
+            if found != expected:
+                raise RuleMismatch(f"get_valid_moves su {[str(c) for c in r.current_trick]}: "
+                                   f"{[str(c) for c in found]} invece di {[str(c) for c in expected]}")
+
+            for card in player.hand:
+                try:
+                    r._validate_move(player, card)
+                    accepted = True
+                except Exception:
+                    accepted = False
+                if accepted != (card in expected):
+                    raise RuleMismatch(f"_validate_move su {[str(c) for c in r.current_trick]}: "
+                                       f"{card} {'accettata' if accepted else 'rifiutata'}")
+
+            r.play_card(player.name, rng.choice(found))
+
+
+def check_tricks(cases, rng):
+    """Vincitore delle mani, semi mancanti e fine round incrementali contro le vecchie regole"""
+    for _ in range(cases):
+        r = _new_round(rng)
+        missing = {p.name: set() for p in r.players}
+        while r.state == RoundState.PLAYING:
+            player = r.players[r.current_turn_index]
+            card = rng.choice(r.get_valid_moves(player))
+            trick = r.current_trick + [card]
+            order = r.trick_order + [player]
+            r.play_card(player.name, card)
+
+            # Vecchio _calculate_missing_suits: riesamina tutto il trick dopo ogni carta
+            lead_suit = _ref_lead_suit(trick)
+            if len(trick) >= 2 and lead_suit is not None:
+                for c in trick:
+                    if c.type == CardType.NUMBER and c.suit != lead_suit:
+                        missing[order[trick.index(c)].name].add(lead_suit)
+            if r.missing_suits != missing:
+                raise RuleMismatch(f"missing_suits dopo {[str(c) for c in trick]}: {r.missing_suits} invece di {missing}")
+
+            if len(trick) < len(r.players):
+                continue
+            winner = order[winning_card(trick, r.trump_suit)]
+            if r.last_trick_winner != winner.name or r.players[r.current_turn_index] is not winner:
+                raise RuleMismatch(f"mano {[str(c) for c in trick]} briscola {r.trump_suit}: "
+                                   f"vince {r.last_trick_winner} invece di {winner.name}")
+            finished = all(not p.hand for p in r.players)
+            if (r.state == RoundState.FINISHED) != finished:
+                raise RuleMismatch(f"stato {r.state} con {sum(len(p.hand) for p in r.players)} carte ancora in mano")
+
+
+CHECKS = {
+    'beats': check_beats,
+    'deal_sampler': check_deal_sampler,
+    'valid_moves': check_valid_moves,
+    'tricks': check_tricks,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confronta le regole ottimizzate con quelle di riferimento")
+    parser.add_argument('--cases', type=int, default=3000, help="casi casuali per ogni controllo")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', default=None, help="solo questi controlli")
+    args = parser.parse_args()
+
+    failed = False
+    for name, check in CHECKS.items():
+        if args.only and name not in args.only:
+            continue
+        start = time.perf_counter()
+        try:
+            check(args.cases, random.Random(args.seed))
+        except RuleMismatch as e:
+            print(f"{name:20s} DIFFERENZA: {e}")
+            failed = True
+            continue
+        print(f"{name:20s} ok ({args.cases} casi, {time.perf_counter() - start:.1f}s)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
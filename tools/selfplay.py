@@ -0,0 +1,144 @@
+# tools/selfplay.py
+"""
+Partite complete bot contro bot, senza server né pause, su un pool di processi.
+
+Ogni partita è un engine.game.Game con soli bot; alla fine si stampano partite/s,
+decisioni/s, la percentuale di scommesse centrate e la distribuzione dei punteggi.
+Con --out ogni partita viene scritta come una riga JSON (punteggi, scommesse, prese).
+
+Uso: python -m tools.selfplay --games 200 --players 4 --rounds 1,2,3 --engine ismcts --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine.enums import RoundState
+from engine.game import Game
+
+
+def play_game(seed, num_players, config):
+    """Gioca una partita intera e ritorna un dict con punteggi e contatori"""
+    config = dict(config, seed=seed)
+    names = [f"bot_{i}" for i in range(num_players)]
+    decisions = 0
+    decision_time = 0.0
+    rounds = []
+
+    # Game e Round stampano molto: in self-play l'output non serve
+    with contextlib.redirect_stdout(io.StringIO()):
+        game = Game(names, config)
+        while game.start_next_round():
+            r = game.current_round
+
+            if r.state == RoundState.WAITING_FOR_DEALER_TRUMP:
+                r.set_trump_suit(r.get_bot_trump_choice(r.players[r.dealer_index]))
+
+            while r.state == RoundState.BIDDING:
+                p = r.players[r.current_turn_index]
+                start = time.perf_counter()
+                bid = r.get_bot_prediction(p)
+                decision_time += time.perf_counter() - start
+                decisions += 1
+                r.make_bid(p.name, bid)
+
+            while r.state == RoundState.PLAYING:
+                p = r.players[r.current_turn_index]
+                start = time.perf_counter()
+                card = r.get_bot_card_to_play(p)
+                decision_time += time.perf_counter() - start
+                decisions += 1
+                r.play_card(p.name, card)
+
+            r.calculate_scores()
+            rounds.append({
+                "cards": r.cards_per_player,
+                "bids": [r.bids[n] for n in names],
+                "tricks": [r.tricks_won[n] for n in names],
+            })
+
+    return {
+        "seed": seed,
+        "scores": [p.score for p in game.players],
+        "rounds": rounds,
+        "decisions": decisions,
+        "decision_time": decision_time,
+    }
+
+
+def _report(results, elapsed, num_players):
+    games = len(results)
+    decisions = sum(g['decisions'] for g in results)
+    decision_time = sum(g['decision_time'] for g in results)
+    bids = hits = 0
+    for g in results:
+        for r in g['rounds']:
+            bids += len(r['bids'])
+            hits += sum(b == t for b, t in zip(r['bids'], r['tricks']))
+
+    print(f"Partite: {games} in {elapsed:.1f}s ({games / elapsed:.2f} partite/s)")
+    print(f"Decisioni: {decisions} ({decisions / elapsed:.1f}/s, {1000 * decision_time / max(decisions, 1):.1f} ms l'una)")
+    print(f"Scommesse centrate: {100 * hits / max(bids, 1):.1f}%")
+
+    all_scores = [s for g in results for s in g['scores']]
+    print(f"Punteggi: media {statistics.mean(all_scores):.1f}, "
+          f"dev. std {statistics.pstdev(all_scores):.1f}, min {min(all_scores)}, max {max(all_scores)}")
+    for seat in range(num_players):
+        seat_scores = [g['scores'][seat] for g in results]
+        wins = sum(g['scores'][seat] == max(g['scores']) for g in results)
+        print(f"  bot_{seat}: media {statistics.mean(seat_scores):.1f}, vittorie {wins}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play headless bot contro bot")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--rounds', default='1,2,3,4,5,6,7,8,9,10', help="round selezionati, es. 1,2,3")
+    parser.add_argument('--open-cards', action='store_true', help="primo round a carte scoperte")
+    parser.add_argument('--engine', choices=['montecarlo', 'ismcts'], default='montecarlo')
+    parser.add_argument('--simulations', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--deadline-ms', type=int, default=None)
+    parser.add_argument('--rollout-backend', choices=['python', 'numpy'], default='python')
+    parser.add_argument('--bid-samples', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="file JSONL con una riga per partita")
+    args = parser.parse_args()
+
+    config = {
+        'max_players': args.players,
+        'selected_rounds': [int(x) for x in args.rounds.split(',')],
+        'first_round_open_cards': args.open_cards,
+        'ai': {
+            'engine': args.engine,
+            'simulations': args.simulations,
+            'iterations': args.iterations,
+            'deadline_ms': args.deadline_ms,
+            'rollout_backend': args.rollout_backend,
+            'bid_samples': args.bid_samples,
+        },
+    }
+    seeds = range(args.seed, args.seed + args.games)
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(play_game, seeds, [args.players] * args.games, [config] * args.games))
+    else:
+        results = [play_game(seed, args.players, config) for seed in seeds]
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            for g in results:
+                f.write(json.dumps(g) + '\n')
+
+    _report(results, elapsed, args.players)
+
+
+if __name__ == '__main__':
+    main()